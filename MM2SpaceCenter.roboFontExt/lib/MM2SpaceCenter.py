@@ -1,21 +1,22 @@
-import sys
 import os
-import random
-import AppKit
+import time
+import threading
+from PyObjCTools.AppHelper import callAfter, callLater
 from mojo.UI import CurrentSpaceCenter, OpenSpaceCenter
 from mojo.subscriber import Subscriber, registerSpaceCenterSubscriber
 from lib.tools.unicodeTools import GN2UV
+from mojo.events import addObserver, removeObserver
+from mojo.extensions import getExtensionDefault, setExtensionDefault
 
-import metricsMachine
+# metricsMachine, vanilla and the popover (ezui) are imported on first use, to keep RoboFont’s startup fast
 
-from vanilla import FloatingWindow, Button, TextBox, List, Window
-from defconAppKit.windows.baseWindow import BaseWindowController
-from mojo.events import addObserver, removeObserver
-from vanilla import Button
-from mojo.extensions import getExtensionDefault, setExtensionDefault, ExtensionBundle
-import codecs
-import ezui
-import re
+from mm2sc_corpus import word_lists, TEXT_FILES, LANGUAGE_NAMES
+from mm2sc_settings import Settings
+from mm2sc_scheduler import PairScheduler, Prefetcher, TextCache
+from mm2sc_font import get_naked
+from mm2sc_fontstate import FontState
+from mm2sc_engine import PairTextEngine
+from mm2sc_timing import TimingRecorder
 
 
 '''
@@ -24,8 +25,6 @@ Special thanks: Tal Leming, Andy Clymer, David Jonathan Ross, Jackson Cavanaugh,
 Additional development: Wei Huang, Stephen Nixon, Ryan Bugden, Gustavo Ferreira
 
 To do:       
-- If no words, look for next member of the kern group. (Some way of showing/saying this has been done, though? “Words from group: “?)
-- Add ability to change word length
 - Underline the pair in Space Center. Add preference, once this is made possible.
 - Make spacing string such that you can compare open/close around a control glyph, next to current pair.
 '''
@@ -34,467 +33,328 @@ To do:
 EXTENSION_KEY = 'com.cjtype.mms2sc.settings'
 
 
-def get_setting_from_defaults(setting):
-    all_settings = getExtensionDefault(EXTENSION_KEY, fallback={setting:0})
-    setting = all_settings[setting]
+def save_settings_to_defaults(values):
+    setExtensionDefault(EXTENSION_KEY, {})  # This might not be necessary anymore.
+    setExtensionDefault(EXTENSION_KEY, values, validate=True)
 
-    return setting
 
-def get_key(my_dict, val):
-    for key, value in my_dict.items():
-        if val == value:
-            return key
+# One in-memory copy of the user’s settings, shared by every Space Center and the popover
+settings = Settings(
+    load=lambda: getExtensionDefault(EXTENSION_KEY, fallback={}),
+    save=save_settings_to_defaults,
+    call_later=callLater,  # setExtensionDefault is called on the main thread
+    )
 
 
-class MM2SC_Tool(Subscriber):
+class MM2SC_Hub(PairTextEngine):
     '''
     Carries forward all of the MM2SC utilities.
+
+    One hub is shared by every Space Center: it observes MetricsMachine, computes
+    each pair’s text once, and sends the same text to every registered MM2SC_Tool.
+    Making the text itself is up to PairTextEngine, which doesn’t depend on RoboFont.
     '''
 
-    debug = False
+    def __init__(self):
+        # The shared settings and word lists; RoboFont’s glyph name table for unencoded glyphs
+        PairTextEngine.__init__(self, settings=settings, word_store=word_lists, fallback=GN2UV)
+        self.tools = []
+        self.observing = False
+
+        # Generated text, keyed by pair, settings and the versions of the font data it depends on
+        self.text_cache = TextCache()
+        self.font_state = None  # Tracks the font’s changes; see set_font()
+        # Pair changes are debounced and computed on a worker thread; only setRaw happens on the main thread
+        self.scheduler = PairScheduler(self.compute_text_for_pair, self.deliver_text, call_on_main=callAfter)
+        # The pairs around the current one in MetricsMachine’s pair list are computed ahead of time
+        self.prefetcher = Prefetcher(self.prefetch_text_for_pair, self.text_cache, make_key=self.make_cache_key)
+        # Prefetch runs are timed apart, so that the stats are only of the pairs the user is shown
+        self.prefetch_timings = TimingRecorder()
+
+        self.pair = ('A', 'V')
+        self.page = 0  # Which page of the current pair’s words is shown, see more_words()
+        self.indexing = set()  # Paths of custom word lists being indexed
+        self.dictionaries_loaded = False  # Word lists are loaded when the first Space Center opens, not at startup
+
+
+    def add_space_center(self, tool):
+        '''
+        Starts sending text to a tool’s Space Center.
+        '''
 
-    def build(self):
-        self.icon_path = os.path.abspath('../resources/_icon_MM2SC.pdf')  # Image icon to potentially be used on the SC button
-        self.font = CurrentFont()
+        if not self.tools:
+            self.set_font(CurrentFont())
+            try:
+                import metricsMachine
+                self.pair = metricsMachine.GetCurrentPair() 
+            except:
+                self.pair = ('A', 'V')
+        self.tools.append(tool)
+        self.update_observer()
+        if not self.dictionaries_loaded:
+            self.load_dictionaries()
 
-        try:
-            self.pair = metricsMachine.GetCurrentPair() 
-        except:
-            self.pair = ('A', 'V')
-            
-        self.load_dictionaries()
-        self.word_count = get_setting_from_defaults('wordCount')
-        
 
-    def spaceCenterDidOpen(self, info):
+    def remove_space_center(self, tool):
+        if tool in self.tools:
+            self.tools.remove(tool)
+        self.update_observer()
+        if not self.tools:
+            self.set_font(None)
+
+
+    def update_observer(self):
         '''
-        Puts the MM2SC pref button in Space Center,
-        and activates the MM observer. 
+        Only observes MetricsMachine while MM2SC is activated and a Space Center is open.
         '''
 
-        self.sc = info['spaceCenter']
-        gutter = 10
-        b_w = 30
-        inset_b = 1
+        should_observe = bool(settings.activateToggle and self.tools)
+        if should_observe and not self.observing:
+            addObserver(self, 'MM_pair_changed', 'MetricsMachine.currentPairChanged')
+            self.observing = True
+            # print('MM2SC observer is now activated.')
+        elif not should_observe and self.observing:
+            removeObserver(self, 'MetricsMachine.currentPairChanged')
+            self.observing = False
+            self.scheduler.stop()
+            self.prefetcher.stop()
+            # print('MM2SC observer is deactivated.')
 
-        x, y, w, h = self.sc.top.glyphLineInput.getPosSize()
-        b_h = h - inset_b * 2
 
-        # Maybe it makes more sense to put it after the After box?
-        # Resize glyph line input
-        self.sc.top.glyphLineInput.setPosSize((x, y, w - b_w - gutter, h))
-        x, y, w, h = self.sc.top.glyphLineInput.getPosSize()
+    def set_font(self, font):
+        '''
+        Switches the font this tool works with. Its changes are followed by a FontState,
+        which keeps the cached lookups up to date; the previous font’s state is let go.
+        '''
 
-        # Create MM2SC button
-        button_placement = (w + gutter, y + inset_b, b_w, b_h)
-        self.sc.MM2SC_button = Button(
-            button_placement, 
-            title='MM',
-            callback=self.button_callback, 
-            sizeStyle='small'
-            )
-        self.sc.MM2SC_button.getNSButton().setBordered_(0)
-        self.sc.MM2SC_button.getNSButton().setBezelStyle_(2)
+        if self.font is not None and font is not None and get_naked(self.font) is get_naked(font):
+            self.font = font
+            return
+        if self.font_state is not None:
+            self.font_state.remove_listener(self.font_state_changed)
+            self.font_state.detach()
+            self.font_state = None
+        self.font = font
+        # Text for another font is of no more use
+        self.text_cache.clear()
+        if self.font is not None:
+            self.font_state = FontState(self.font)
+            self.font_state.add_listener(self.font_state_changed)
+            self.font_state.attach()
 
-        self.activate_module()
 
+    def font_state_changed(self, state, category, notification):
+        if category == 'kerning':
+            # The user is kerning: hold off on prefetching for a moment
+            self.prefetcher.note_edit()
 
-    def spaceCenterWillClose(self, info):
-        self.deactivate_module()
-        
 
-    def button_callback(self, sender):
+    def load_dictionaries(self):
         '''
-        Opens the prefs window.
+        Points this tool at the shared word-list store, and loads the selected
+        languages and the custom word list on background threads.
         '''
 
-        if len(AllFonts()) == 0:  # In case this is somehow possible despite having a Space Center open...
-            print('You must have a font open.')
+        self.dict_words = word_lists
+        self.text_files = TEXT_FILES
+        self.language_names = LANGUAGE_NAMES
+        self.dictionaries_loaded = True
+
+        self.load_languages()
+        # A custom word list can be huge, so it is indexed on its own thread
+        self.load_custom_word_list()
+
+
+    def load_languages(self):
+        '''
+        Opens (or compiles) the indexes of the selected languages on a background thread.
+        A pair computed in the meantime waits for its language on the worker thread, not on the main thread.
+        '''
+
+        names = [TEXT_FILES[language] for language in settings.languages]
+        names = [name for name in names if not self.dict_words.is_loaded(name)]
+        if names:
+            threading.Thread(target=self.load_word_lists, args=(self.dict_words, names), name='MM2SC word lists', daemon=True).start()
+
+
+    def load_word_lists(self, store, names):
+        for name in names:
+            try:
+                store.get_index(name)
+            except (OSError, ValueError) as e:
+                print(f'MM2SC couldn’t load the word list {name}: {e}')
+
+
+    def load_custom_word_list(self):
+        '''
+        Starts indexing the custom word list on a background thread, if there is one and it isn’t indexed yet.
+        Until it is done, words come from the selected languages only.
+        '''
+
+        path = settings.customWordList
+        if not path or self.dict_words.is_custom_loaded(path) or path in self.indexing:
+            return
+        if not os.path.exists(path):
+            print(f'MM2SC couldn’t find the custom word list: {path}')
             return
+        self.indexing.add(path)
+        threading.Thread(target=self.index_custom_word_list, args=(path,), name='MM2SC custom word list', daemon=True).start()
 
-        MM2SpaceCenterPopover(self.sc.MM2SC_button, self.sc)
 
+    def index_custom_word_list(self, path):
+        name = os.path.basename(path)
+        last_status = None
 
-    def activate_module(self):
-        addObserver(self, 'MM_pair_changed', 'MetricsMachine.currentPairChanged')
-        # print('MM2SC observer is now activated.')
-        
-        
-    def deactivate_module(self):
-        removeObserver(self, 'MetricsMachine.currentPairChanged')
-        # print('MM2SC observer is deactivated.')
+        def progress(done, total, stage):
+            nonlocal last_status
+            status = stage, 100 * done // total if total else 100
+            if status != last_status:
+                last_status = status
+                callAfter(self.show_status, f'Indexing custom word list {name} ({stage})… {status[1]}%')
 
+        try:
+            self.dict_words.get_custom_index(path, progress)
+        except (OSError, ValueError) as e:
+            callAfter(self.show_status, f'MM2SC couldn’t index the custom word list {name}: {e}')
+            return
+        finally:
+            self.indexing.discard(path)
+        callAfter(self.custom_word_list_loaded, path)
 
-    def load_dictionaries(self):
+
+    def custom_word_list_loaded(self, path):
+        print(f'MM2SC custom word list is ready: {path}')
+        # Text made while it was indexing doesn’t have its words
+        self.text_cache.clear()
+        if self.observing:
+            self.prepare_font_caches()
+            self.scheduler.submit(self.pair)
+
+
+    def show_status(self, text):
+        '''
+        Shows a message in every registered Space Center, in place of the words.
+        Nothing is shown while MM2SC is off, so the user’s own Space Center text is left alone.
         '''
-        Loads the available wordlists and reads their contents.
-        '''
-
-        self.dict_words = {}
-        self.text_files = ['catalan', 'czech', 'danish', 'dutch', 'ukacd', 'finnish', 'french', 'german', 'hungarian', 'icelandic', 'italian', 'latin', 'norwegian', 'polish', 'slovak', 'spanish', 'vietnamese']
-        self.language_names = ['Catalan', 'Czech', 'Danish', 'Dutch', 'English', 'Finnish', 'French', 'German', 'Hungarian', 'Icelandic', 'Italian', 'Latin', 'Norwegian', 'Polish', 'Slovak', 'Spanish', 'Vietnamese syllables']
-
-        # # Check if a custom word-list should be loaded. (Defunct)
-        # custom_index = len(self.text_files) + 2
-        # if sender.get() == custom_index: # Custom word list
-        #     try:
-        #         file_path = getFile(title='Load custom word list', messageText='Select a text file with words on separate lines', fileTypes=['txt'])[0]
-        #     except TypeError:
-        #         file_path = None
-        #         self.custom_words = []
-        #         print('Input of custom word list canceled, using default')
-        #     if file_path is not None:
-        #         with codecs.open(file_path, mode='r', encoding='utf-8') as fo:
-        #             lines = fo.read()
-
-        #         self.custom_words = []
-        #         for line in lines.splitlines():
-        #             w = line.strip() # strip whitespace from beginning/end
-        #             self.custom_words.append(w)
-
-        bundle = ExtensionBundle('MM2SpaceCenter')
-        content_limit  = '*****'  # If word list file contains a header, start looking for content after this delimiter
-
-        # Read included text files
-        for text_file in self.text_files:
-            path = bundle.getResourceFilePath(text_file)
-            with codecs.open(path, mode='r', encoding='utf-8') as fo:
-                lines = fo.read()
-            self.dict_words[text_file] = lines.splitlines()  # This assumes no whitespace has to be stripped
-
-            # Strip header
-            try:
-                content_start = self.dict_words[text_file].index(content_limit) + 1
-                self.dict_words[text_file] = self.dict_words[text_file][content_start:]
-            except ValueError:
-                pass
 
-        # Read user dictionary
-        with open('/usr/share/dict/words', 'r') as userFile:
-            lines = userFile.read()
-        self.dict_words['user'] = lines.splitlines()
+        if not self.observing:
+            return
+        for tool in list(self.tools):
+            tool.set_space_center(self.font, text)
 
             
-    def sort_words_by_width(self, word_list):
-        '''
-        Sorts the list of words by width.
-        '''
-        def find_kerning(chars):
-            '''
-            Helper function to find kerning between two given glyphs.
-            This assumes MetricsMachine style group names.
-            '''
-            markers = ['@MMK_L_', '@MMK_R_']
-            keys = [c for c in chars]
-            for i in range(2):
-                all_groups = self.font.groups.findGlyph(chars[i])
-                if len(all_groups) > 0:
-                    for g in all_groups:
-                        if markers[i] in g:
-                            keys[i] = g
-                            continue
-            key = (keys[0], keys[1])
-            if self.font.kerning.has_key(key):
-                return self.font.kerning[key]
+    def MM_pair_changed(self, sender):
+        current_pair = sender['pair']
+        if current_pair != self.pair:
+            self.pair = current_pair
+            self.page = 0
+            import metricsMachine
+            self.set_font(metricsMachine.CurrentFont())
+            # Build the font lookups here on the main thread, then compute the text in the background
+            self.prepare_font_caches()
+            text = self.text_cache.get(self.make_cache_key(self.pair))
+            if text is not None:
+                self.scheduler.cancel()
+                self.deliver_text(text)
             else:
-                return 0
-
-        f = self.font
-        word_widths = []
-        for word in word_list:
-            unit_count = 0
-            for char in word:
-                glyph = None
-                try:
-                    glyph = f[char]
-                except KeyError:
-                    gname = self.get_gname_from_char(char)
-                    if gname:
-                        glyph = f[gname]
-                if glyph:
-                    unit_count += glyph.width
-            # Add kerning
-            for i in range(len(word) - 1):
-                pair = word[i:i + 2]
-                unit_count += int(find_kerning(pair))
-            word_widths.append((word, unit_count))
-
-        word_widths_sorted = sorted(word_widths, key=lambda x: x[1])
-
-        return [word for word, width in word_widths_sorted]
+                self.scheduler.submit(self.pair)
+            self.prefetch_around(self.pair)
 
 
-    def MM_pair_changed(self, sender):
-        if get_setting_from_defaults('activateToggle') == True:
-            current_pair = sender['pair']
-            if current_pair != self.pair:
-                self.pair = current_pair
-                self.font = metricsMachine.CurrentFont()
-                self.words_for_pair()
+    # The font data a pair’s text is made from. Widths and kerning only matter when words are sorted by width.
+    text_dependencies = ('glyph_set', 'unicodes', 'groups')
+    sorted_text_dependencies = text_dependencies + ('widths', 'kerning')
 
+    def make_cache_key(self, pair):
+        if self.font_state is None:
+            return (pair, settings.fingerprint(), None)
+        dependencies = self.sorted_text_dependencies if settings.listOutput else self.text_dependencies
+        return (pair, settings.fingerprint(), id(self.font_state), self.font_state.version(*dependencies))
 
-    def set_space_center(self, font, text):    
+
+    def compute_text_for_pair(self, pair, page=0, seed=None, is_stale=None):
+        '''
+        make_text_for_pair(), with the first page kept in the text cache for when the user comes back to the pair.
+        '''
+
+        key, epoch = self.make_cache_key(pair), self.text_cache.epoch
+        text = self.make_text_for_pair(pair, is_stale=is_stale, seed=seed, page=page)
+        if text is not None and page == 0:
+            self.text_cache.put(key, text, epoch=epoch)
+        return text
+
+
+    def prefetch_text_for_pair(self, pair, is_stale=None):
+        return self.make_text_for_pair(pair, is_stale=is_stale, timings=self.prefetch_timings)
+
+
+    def get_cache_stats(self):
+        return self.text_cache.stats()
+
+
+    def prefetch_around(self, pair):
         try:
-            self.sc.setRaw(text)
-            # Make sure 'Show Kerning' is on in the Space Center
-            if not self.sc.glyphLineView.getApplyKerning():
-                lv.setApplyKerning(True)
-        except AttributeError:
-            print('Opening Space Center. Go back to MetricsMachine.')
-            OpenSpaceCenter(font, newWindow=False)
-            self.sc = CurrentSpaceCenter()
-            self.sc.setRaw(text)
+            import metricsMachine
+            pairs = metricsMachine.GetPairList()
+        except Exception:
+            return
+        if pairs:
+            self.prefetcher.prefetch(list(pairs), pair)
 
-    
-    def randomize_list(self, word_list):
-        return iter(random.sample(word_list, len(word_list)))
 
+    def prepare_font_caches(self):
+        '''
+        Builds the font lookups a pair’s text needs, so that the worker and prefetch threads never read the font themselves.
+        '''
 
-    def check_encoded(self, gname):
-        escape_set = {'slash'}  # 'backslash'
-        if gname in self.font.keys():
-            if gname in escape_set or self.font[gname].unicodes == ():
-                return False
-            else: 
-                return True
-        else:
-            return False
+        if self.font is None:
+            return
+        self.get_font_snapshot()
+        # Used by the group fallback, whether or not words are sorted by width
+        self.get_kerning_resolver()
+        if settings.listOutput:
+            self.get_width_engine()
 
 
-    def get_pair_in_chars(self, pair):
+    def deliver_text(self, text):
         '''
-        Converts glyph names to characters, in order to find words in dictionary.
+        Sends the same text to every registered Space Center.
         '''
 
-        def remove_suffix(gname):
-            '''
-            Removes the suffix from a glyph name.
-            '''
-            period_pos = gname.find('.')
-            return gname[:period_pos] if period_pos > 0 else gname
-        
-        try:
-            left_no_suffix = remove_suffix(pair[0])
-            right_no_suffix = remove_suffix(pair[1])
-            return self.get_pair_in_sc_strings((left_no_suffix, right_no_suffix))
-        except:
-            if self.debug: print('Couldn’t convert pair to chars.')
-            return pair
+        start = time.perf_counter()
+        for tool in list(self.tools):
+            tool.set_space_center(self.font, text)
+        # Goes with the run that made the text, if it was made for this pair
+        self.timings.record('set_raw', time.perf_counter() - start, label='/'.join(self.pair))
 
 
-    def get_pair_in_sc_strings(self, pair):
-        return self.get_sc_string_from_gname(pair[0]), self.get_sc_string_from_gname(pair[1])
+    def get_timing_stats(self):
+        '''
+        Returns p50, p95 and max milliseconds for each stage, over the recent pairs.
+        '''
 
+        return self.timings.stats()
 
-    def get_sc_string_from_gname(self, gname):
-        if not self.check_encoded(gname):
-            sc_string = '/' + gname + ' '
-        else:
-            uni = self.font[gname].unicodes[0]
-            char = chr(uni)
-            sc_string = char
-        return sc_string 
 
+    def dump_timings(self, path):
+        '''
+        Writes the recent timings to a JSON Lines file, for offline analysis.
+        '''
 
-    def get_gname_from_char(self, char):
-        try:
-            uni = ord(char)
-        except TypeError:
-            return ''
-
-        if uni in GN2UV.values():
-            gname = str(get_key(GN2UV, uni))
-        else:
-            gname = ''
-        return gname
-
-
-    def get_char_from_gname(self, gname, no_suff=False):
-        if no_suff == True:
-            gname = gname.split(".")[0]
-        if gname in GN2UV.keys():
-            char = chr(GN2UV[gname])
-        else:
-            char = ''
-        return char
-
-
-    def make_spacing_string(self, pair):
-        context = get_setting_from_defaults('context')
-
-        # Accurate pair string to be easily swapped into the context
-        pair_string = ''.join(list(self.get_pair_in_sc_strings(pair)))  
-
-        context_strings = {
-            1: 'HH__HO__OH__OO__HH',                    # 'UC' context
-            2: 'nn__no__on__oo__nn',                    # 'LC' context
-            3: '11__10__01__00__11',                    # 'Figs' context
-
-            # Fraction contexts probably need some love.
-            4:   '11__/10/__01__/00/__11',              # 'Frac' context
-            4.1: '11/eight.numr __10/one.numr __00' ,   # 'Frac' alt context 1
-            4.2: '11__/eight.dnom 10__/eight.dnom 00',  # 'Frac' alt context 2
-        }
-        
-        # The pair string to use when searching for appropriate contexts. (Ignore suffix)
-        pair_search_string = ''.join([self.get_char_from_gname(pair[0], no_suff=True), self.get_char_from_gname(pair[1], no_suff=True)])
-
-        # If it's not set to Auto context, then just pull the context from above.
-        if not context == 0:
-            # Fractions
-            if context == 4:
-                string = context_strings[4].replace('__', pair_string)
-                # Not sure what this is, but keeping it in
-                if pair_string.startswith('⁄'):  # fraction at start of pair
-                    string = context_strings[4.1].replace('__', pair_string)
-                elif pair_string.endswith('⁄'):  # fraction at end of pair
-                    string = context_strings[4.2].replace('__', pair_string)
-            # If not Fractions, just set the context to whatever the selected setting is.
-            else:
-                string = context_strings[context].replace('__', pair_string)
-
-        # Automatic contexts
-        else:
-            # Figures
-            if bool(set(pair_search_string) & set("0123456789")):  # A check to see if any side of the pair is a figure
-                string = context_strings[3].replace('__', pair_string)
-            # UC
-            elif pair_search_string == pair_search_string.upper():
-                string = context_strings[1].replace('__', pair_string)
-            # lc
-            else:
-                string = context_strings[2].replace('__', pair_string)
-            # Support auto-fractions later
-
-        return string + '\\n'
-
-
-    # Can delete all the close/open duplicates of open/close
-    open_close_pairs = {
-        # Initial/final punctuation (from https://www.compart.com/en/unicode/category/Pi and https://www.compart.com/en/unicode/category/Pf)
-        "’": "‘",
-        # "„": "“",
-        # "„": "”",
-        "‘": "’",
-        "‛": "’",
-        "“": "”",
-        "‟": "”",
-        "‹": "›",
-        # "›": "‹",
-        "«": "»",
-        # "»": "«",
-        "⸂": "⸃",
-        "⸄": "⸅",
-        "⸉": "⸊",
-        "⸌": "⸍",
-        "⸜": "⸝",
-        "⸠": "⸡",
-        #"”": "”",  # These will make two contexts show up for quotes so leaving them off for now
-        #"’": "’",
-
-        # Miscellaneous but common open/close pairs
-        "'": "'",
-        '"': '"',
-        "¡": "!",
-        "¿": "?",
-        "←": "→",
-        # "→": "←",
-        "/": "\\",
-        
-        "<": ">",  # less, greater
-        # ">": "<",  # greater, less
-
-        # Opening/closing punctuation (from https://www.compart.com/en/unicode/category/Ps & https://www.compart.com/en/unicode/category/Pe)
-        "(": ")",
-        "[": "]",
-        "{": "}",
-        "༺": "༻", "༼": "༽", "᚛": "᚜", "‚": "‘", "⁅": "⁆", "⁽": "⁾", "₍": "₎", "⌈": "⌉", "⌊": "⌋", "〈": "〉", "❨": "❩", "❪": "❫", "❬": "❭", "❮": "❯", "❰": "❱", "❲": "❳", "❴": "❵", "⟅": "⟆", "⟦": "⟧", "⟨": "⟩", "⟪": "⟫", "⟬": "⟭", "⟮": "⟯", "⦃": "⦄", "⦅": "⦆", "⦇": "⦈", "⦉": "⦊", "⦋": "⦌", "⦍": "⦎", "⦏": "⦐", "⦑": "⦒", "⦓": "⦔", "⦕": "⦖", "⦗": "⦘", "⧘": "⧙", "⧚": "⧛", "⧼": "⧽", "⸢": "⸣", "⸤": "⸥", "⸦": "⸧", "⸨": "⸩", "〈": "〉", "《": "》", "「": "」", "『": "』", "【": "】", "〔": "〕", "〖": "〗", "〘": "〙", "〚": "〛", "〝": "〞", "⹂": "〟", "﴿": "﴾", "︗": "︘", "︵": "︶", "︷": "︸", "︹": "︺", "︻": "︼", "︽": "︾", "︿": "﹀", "﹁": "﹂", "﹃": "﹄", "﹇": "﹈", "﹙": "﹚", "﹛": "﹜", "﹝": "﹞", "（": "）", "［": "］", "｛": "｝", "｟": "｠", "｢": "｣",
-    }
-
-    def make_open_close_context(self, pair):
-        '''
-        Returns a string of the pair within an open/close context, to judge the symmetry of open/close kerns.
-        '''
-
-        # Get all unicodes to make sure we don’t show pairs that don’t exist in the font
-        unis_in_font = [u for glyph in CurrentFont() for u in glyph.unicodes]
-
-        # Left and right, to compare against the dictionary
-        left_search, right_search = self.get_char_from_gname(pair[0], no_suff=True), self.get_char_from_gname(pair[1], no_suff=True)
-        # Left and right, to add to the Space Center
-        l_sc, r_sc  = self.get_sc_string_from_gname(pair[0]), self.get_sc_string_from_gname(pair[1])
-
-        is_left_encoded  = self.check_encoded(pair[0])
-        is_right_encoded = self.check_encoded(pair[1])
-
-        if self.debug: print('MM2SC open/close info:', pair, l_sc, r_sc, "\tHave unicodes?:", is_left_encoded, is_right_encoded)
-
-        # Stop if the glyphs aren't open/close
-        if not left_search in self.open_close_pairs.keys() and not left_search in self.open_close_pairs.values():
-            if not right_search in self.open_close_pairs.keys() and not right_search in self.open_close_pairs.values():
-                return ''
-
-        open_close_string = ''
-        # if is_left_encoded and is_right_encoded:
-        for open_close_pair in self.open_close_pairs.items():
-
-            # Saving the suffixes to add back to the correlating open/close
-            l_suff = ''
-            if '.' in l_sc:
-                l_suff = '.' + '.'.join(pair[0].split('.')[1:])
-            r_suff = ''
-            if '.' in r_sc:
-                r_suff = '.' + '.'.join(pair[1].split('.')[1:])
-
-            if open_close_pair == (left_search, right_search):
-                if self.debug: print('Debug: Open/Close situation 1')
-                open_close_string = l_sc + r_sc
-                break
-            elif open_close_pair == (right_search, left_search):
-                if self.debug: print('Debug: Open/Close situation 2')
-                open_close_string = r_sc + l_sc
-                break
-
-            # Open and close
-            # If the left is an open. And the close is in the font
-            elif open_close_pair[0] == left_search and ord(open_close_pair[1]) in unis_in_font:
-                if self.debug: print('Debug: Open/Close situation 3')
-                # Get the close/open equivalent suffixed for open/close
-                close_with_l_suff = self.get_sc_string_from_gname(self.get_gname_from_char(self.open_close_pairs[left_search]) + l_suff)
-                open_close_string = l_sc + r_sc + close_with_l_suff
-                break
-            # If the right is a close. And the open is in the font
-            elif open_close_pair[1] == right_search and ord(open_close_pair[0]) in unis_in_font:
-                if self.debug: print('Debug: Open/Close situation 4')
-                open_with_r_suff  = self.get_sc_string_from_gname(self.get_gname_from_char(get_key(self.open_close_pairs, right_search)) + r_suff) 
-                open_close_string = open_with_r_suff + l_sc + r_sc
-                break
-
-            # Now close and open
-            # If the right is an open. And the close is in the font
-            elif open_close_pair[0] == right_search and ord(open_close_pair[1]) in unis_in_font:
-                if self.debug: print('Debug: Open/Close situation 5')
-                close_with_r_suff = self.get_sc_string_from_gname(self.get_gname_from_char(self.open_close_pairs[right_search]) + r_suff)
-                open_close_string = close_with_r_suff + l_sc + r_sc
-                break
-            # If the left is a close. And the open is in the font
-            elif open_close_pair[1] == left_search and ord(open_close_pair[0]) in unis_in_font:
-                if self.debug: print('Debug: Open/Close situation 6')
-                open_with_l_suff  = self.get_sc_string_from_gname(self.get_gname_from_char(get_key(self.open_close_pairs, left_search)) + l_suff)
-                open_close_string =  l_sc + r_sc + open_with_l_suff
-                break
-
-        if self.debug: print('Open/close string:', open_close_string)
-        return open_close_string + ' '
-           
-
-    def make_mirrored_pair(self, pair):
-        '''
-        Returns a string of the pair mirrored, to judge the symmetry of kerns.
-        '''
-
-        left, right = self.get_pair_in_sc_strings(pair)
-        return left + right + left + right + ' ' 
+        self.timings.dump(path)
+
+
+    def more_words(self):
+        '''
+        Shows the next page of words for the current pair, continuing in the same order.
+        '''
+
+        if not self.tools:
+            return
+        self.page += 1
+        # The font may have changed since the pair was shown; rebuild its lookups here, not on the worker
+        self.prepare_font_caches()
+        self.scheduler.submit(self.pair, self.page, self.pair_seeds.get(self.pair))
 
 
     def words_for_pair(self, ):
@@ -502,233 +362,104 @@ class MM2SC_Tool(Subscriber):
         Generates all output text and puts it in Space Center.
         '''
 
-        # Store settings in variables so the function only needs to be called once
-        language           = get_setting_from_defaults('language')
-        word_count         = int(get_setting_from_defaults('wordCount'))
-        all_uppercase      = get_setting_from_defaults('allUppercase')
-        list_output        = get_setting_from_defaults('listOutput')
-        mirrored_pair      = get_setting_from_defaults('mirroredPair')
-        open_close_context = get_setting_from_defaults('openCloseContext')
-        context            = get_setting_from_defaults('context')
-        
-        # Try getting pair_string once in order to check if encoded
-        pair_string = ''.join(list(self.get_pair_in_sc_strings(self.pair)))
-
-        # Convert MM tuple into search pair to check uc, lc, mixed case
-        pair_to_char_string = ''.join(self.get_pair_in_chars(self.pair))
-
-        # Search for non-suffixed
-        search_string = ''.join(chr(self.font[gname.split('.')[0]].unicode) for gname in self.pair)
-
-        # Get the spacing string
-        spacing_string = self.make_spacing_string(self.pair)
-
-        # Check if string is uppercase
-        if pair_to_char_string.isupper():
-            make_upper = True
-            search_string = search_string.lower()
-        else:
-            make_upper = False
-
-        # Check for mixed case
-        mixed_case = False
-        pair_chars = self.get_pair_in_chars(self.pair)
-        is_left_encoded = self.check_encoded(self.pair[0])
-        is_right_encoded = self.check_encoded(self.pair[1])
-        if pair_chars[0].isupper() and pair_chars[1].islower() and is_left_encoded and is_right_encoded:
-            mixed_case = True
-
-        # Get all the words from the text file
-        all_words = []
-        if language == len(self.text_files):  # Use all languages
-            for i in len(self.text_files):
-                # If any language: concatenate all the word lists
-                all_words.extend(self.dict_words[self.text_files[i]])
-        else:
-            all_words = self.dict_words[self.text_files[language]]
-
-        # Add words to the word list until we reach the desired amount of words
-        # Currently allows any word length. This could be customized later.
-        count = 0
-        word_list = []
-        word_set = set(word_list)
-        for word in self.randomize_list(all_words):
-            if search_string in word and word not in word_set:
-                word_set.add(word)
-                word_list.append(word)
-                count += 1
-
-            # Try capitalizing lowercase words
-            elif mixed_case and search_string.lower() in word[:2]:
-                word = word.capitalize()
-                if word not in word_set:
-                    word_set.add(word)
-                    word_list.append(word)
-                    count += 1
-
-            if count >= word_count:
-                break
-
-        if all_uppercase or make_upper:
-            # Make text uppercase again
-            word_list = [text.upper() for text in word_list]
-
-        words_text = ''
-        # If there are sample words
-        if word_list:
-            if list_output: # If 'Output as list' is checked:
-                sorted_text = self.sort_words_by_width(word_list)
-                words_text = '\\n'.join(map(str, sorted_text))
-            else:
-                words_text = ' '.join(map(str, word_list))
+        self.deliver_text(self.make_text_for_pair(self.pair))
 
-            words_text = words_text.lstrip()
-            words_text = words_text.replace(pair_to_char_string, '/'+'/'.join(self.pair)+' ' )
-        # If there are no sample words, add some failure text in the place of words text.
-        else:
-            words_text = f'There are no words for pair: {pair_string}'
-            
-        # If you want your pair mirrored
-        mirror_text = ''
-        if mirrored_pair:
-            mirror_text = self.make_mirrored_pair(self.pair)
 
-        # If you want your pair in an open/close context
-        open_close_text = ''
-        if open_close_context:
-            open_close_text = self.make_open_close_context(self.pair)
 
-        text = ' '.join([mirror_text, open_close_text, spacing_string]) + words_text
-        text = text.lstrip()
-        self.set_space_center(self.font, text)
 
+class MM2SC_Tool(Subscriber):
+    '''
+    Adds the MM2SC button to one Space Center, and shows the hub’s text in it.
+    '''
+
+    def build(self):
+        self.icon_path = os.path.abspath('../resources/_icon_MM2SC.pdf')  # Image icon to potentially be used on the SC button
 
 
+    def spaceCenterDidOpen(self, info):
+        '''
+        Puts the MM2SC pref button in Space Center,
+        and registers it with the shared hub.
+        '''
 
+        from vanilla import Button
 
-# ========== MM2SC Preferences Popover (Made with EZUI) ========== #
+        self.sc = info['spaceCenter']
+        gutter = 10
+        b_w = 30
+        inset_b = 1
 
-class MM2SpaceCenterPopover(ezui.WindowController):
-    
-    
-    def build(self, parent, space_center):
+        x, y, w, h = self.sc.top.glyphLineInput.getPosSize()
+        b_h = h - inset_b * 2
 
-        self.sc = space_center
+        # Maybe it makes more sense to put it after the After box?
+        # Resize glyph line input, to make room for the MM and More Words buttons
+        self.sc.top.glyphLineInput.setPosSize((x, y, w - b_w * 2 - gutter, h))
+        x, y, w, h = self.sc.top.glyphLineInput.getPosSize()
 
-        content = '''
-        [ ] Activate MM2SC                 @activateToggle
-        
-        ---------------
-        
-        * TwoColumnForm @form
+        # Create MM2SC button
+        button_placement = (w + gutter, y + inset_b, b_w, b_h)
+        self.sc.MM2SC_button = Button(
+            button_placement, 
+            title='MM',
+            callback=self.button_callback, 
+            sizeStyle='small'
+            )
+        self.sc.MM2SC_button.getNSButton().setBordered_(0)
+        self.sc.MM2SC_button.getNSButton().setBezelStyle_(2)
 
-        > : Language:
-        > (English ...)                    @language
+        # Create More Words button, which pages through the current pair’s words
+        more_button_placement = (w + gutter + b_w, y + inset_b, b_w, b_h)
+        self.sc.MM2SC_more_button = Button(
+            more_button_placement, 
+            title='→',
+            callback=self.more_button_callback, 
+            sizeStyle='small'
+            )
+        self.sc.MM2SC_more_button.getNSButton().setBordered_(0)
+        self.sc.MM2SC_more_button.getNSButton().setBezelStyle_(2)
+        self.sc.MM2SC_more_button.getNSButton().setToolTip_('More words for this pair')
 
-        > : Spacing Context:
-        > (Auto ...)                       @context
+        hub.add_space_center(self)
 
-        > : Max Word Count:
-        > [_30               _]            @wordCount
+
+    def spaceCenterWillClose(self, info):
+        hub.remove_space_center(self)
         
-        ---------------
 
-        [ ] Make words all-caps            @allUppercase
-        [ ] Output as list sorted by width @listOutput
-        [X] Show mirrored pair (LRLR)      @mirroredPair
-        [X] Show open & close context {n}  @openCloseContext
+    def button_callback(self, sender):
         '''
-        
-        initial_word_count = 30
-        context_options = ['Auto', 'Uppercase', 'Lowercase', 'Figures', 'Fractions']
-        language_names = ['Catalan', 'Czech', 'Danish', 'Dutch', 'English', 'Finnish', 'French', 'German', 'Hungarian', 'Icelandic', 'Italian', 'Latin', 'Norwegian', 'Polish', 'Slovak', 'Spanish', 'Vietnamese syllables']
-
-        descriptionData = dict(
-            form=dict(
-                titleColumnWidth=106,
-                itemColumnWidth=90
-            ),
-            # wordCount=dict(
-            #         continuous=False,
-            # ),
-            language=dict(
-                    items=language_names
-            ),
-            context=dict(
-                    items=context_options
-            ),
-            listOutput=dict(
-                    sizeStyle='small'
-            ),
-            openCloseContext=dict(
-                    sizeStyle='small'
-            ),
-            mirroredPair=dict(
-                    sizeStyle='small'
-            ),
-            allUppercase=dict(
-                    sizeStyle='small'
-            ),
-        )
-        self.w = ezui.EZPopover(
-            content=content,
-            descriptionData=descriptionData,
-            controller=self,
-            parent=parent,
-            parentAlignment='bottom',
-            behavior='transient',
-            size='auto'
-        )
-        self.wordCountField   = self.w.getItem('wordCount')
-        self.wordCountField.set(initial_word_count)
-        self.languageField    = self.w.getItem('language')
-        self.languageField.set(4)
-        # May not need these:
-        self.activateToggle   = self.w.getItem('activateToggle')
-        self.contextField     = self.w.getItem('context')
-        self.listOutput       = self.w.getItem('listOutput')
-        self.openCloseContext = self.w.getItem('openCloseContext')
-        self.mirroredPair     = self.w.getItem('mirroredPair')
-        self.allUppercase     = self.w.getItem('allUppercase')
-
-    def started(self):
-        self.w.open()
-        values = getExtensionDefault(EXTENSION_KEY, fallback=self.w.getItemValues())
-        self.w.setItemValues(values)  # Set the previous preferences from user
-    
-    def flush_and_register_defaults(self):
-        setExtensionDefault(EXTENSION_KEY, {})  # This might not be necessary anymore.
-        setExtensionDefault(EXTENSION_KEY, self.w.getItemValues(), validate=True)
-        print(getExtensionDefault(EXTENSION_KEY))  # Print a readout of the user’s updated MM2SC settings
-        
-    def activateToggleCallback(self, sender):
-        self.flush_and_register_defaults()
-        activation = sender.get()
-        # Can no longer activate the actual observer from this pref menu object/class
-        if activation == True:
-            print(f'MM2SpaceCenter is now set to Active.')
-        else:
-            print(f'MM2SpaceCenter is now set to Inactive.')
-        # Update the Space Center here somehow?
-        
-    def contextCallback(self,sender):
-        self.flush_and_register_defaults()
-    def listOutputCallback(self,sender):
-        self.flush_and_register_defaults()  
-    def openCloseContextCallback(self,sender):
-        self.flush_and_register_defaults()  
-    def mirroredPairCallback(self,sender):
-        self.flush_and_register_defaults()  
-    def allUppercaseCallback(self,sender):
-        self.flush_and_register_defaults()  
-    def sortedCallback(self, sender):
-        self.flush_and_register_defaults()
-    def wordCountCallback(self,sender):
-        self.flush_and_register_defaults()
-    def languageCallback(self,sender):
-        self.flush_and_register_defaults()  
-        # Update the Space Center here somehow?
-
-    
-        
+        Opens the prefs window.
+        '''
+
+        if len(AllFonts()) == 0:  # In case this is somehow possible despite having a Space Center open...
+            print('You must have a font open.')
+            return
+
+        from mm2sc_popover import MM2SpaceCenterPopover
+        MM2SpaceCenterPopover(self.sc.MM2SC_button, self.sc, hub)
+
+
+    def more_button_callback(self, sender):
+        hub.more_words()
+
+
+    def set_space_center(self, font, text):    
+        try:
+            self.sc.setRaw(text)
+            # Make sure 'Show Kerning' is on in the Space Center
+            if not self.sc.glyphLineView.getApplyKerning():
+                self.sc.glyphLineView.setApplyKerning(True)
+        except AttributeError:
+            print('Opening Space Center. Go back to MetricsMachine.')
+            OpenSpaceCenter(font, newWindow=False)
+            self.sc = CurrentSpaceCenter()
+            self.sc.setRaw(text)
+
+
+
+# The one hub shared by every Space Center
+hub = MM2SC_Hub()
+
+
 registerSpaceCenterSubscriber(MM2SC_Tool)
@@ -0,0 +1,826 @@
+import os
+import re
+import sys
+import mmap
+import heapq
+import codecs
+import bisect
+import random
+import struct
+import hashlib
+import tempfile
+import threading
+from array import array
+from itertools import islice
+from collections.abc import Sequence
+
+
+'''
+Word lists for MM2SpaceCenter.
+
+The lists are held in one process-wide store, shared by every Space Center,
+and each language is only read from disk the first time it is asked for.
+Bundled lists are compiled once into a binary index file (see compile_index)
+which is memory-mapped on later launches, instead of re-parsing the text.
+Custom corpora of any size are tokenized and indexed in a streaming pass
+(see load_custom_index).
+This module doesn’t depend on mojo, so it can be used outside of RoboFont.
+'''
+
+
+RESOURCES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'resources'))
+
+TEXT_FILES = ['catalan', 'czech', 'danish', 'dutch', 'ukacd', 'finnish', 'french', 'german', 'hungarian', 'icelandic', 'italian', 'latin', 'norwegian', 'polish', 'slovak', 'spanish', 'vietnamese']
+LANGUAGE_NAMES = ['Catalan', 'Czech', 'Danish', 'Dutch', 'English', 'Finnish', 'French', 'German', 'Hungarian', 'Icelandic', 'Italian', 'Latin', 'Norwegian', 'Polish', 'Slovak', 'Spanish', 'Vietnamese syllables']
+
+CONTENT_LIMIT = '*****'  # If word list file contains a header, start looking for content after this delimiter
+
+
+def default_cache_dir():
+    '''
+    Returns the per-user folder that compiled word indexes are written to.
+    '''
+
+    if sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'MM2SpaceCenter')
+
+
+def read_word_list(path):
+    '''
+    Reads a word list file, one word per line, and strips its header if it has one.
+    '''
+
+    with codecs.open(path, mode='r', encoding='utf-8') as fo:
+        lines = fo.read()
+    words = lines.splitlines()  # This assumes no whitespace has to be stripped
+
+    # Strip header
+    try:
+        content_start = words.index(CONTENT_LIMIT) + 1
+        words = words[content_start:]
+    except ValueError:
+        pass
+
+    return words
+
+
+def iter_random_order(count, rng=random):
+    '''
+    Yields the numbers 0 to count - 1 in random order, one at a time.
+    This is a lazy Fisher–Yates shuffle, so taking k items costs O(k) rather than O(count).
+    '''
+
+    swapped = {}
+    for i in range(count):
+        j = rng.randrange(i, count)
+        yield swapped.get(j, j)
+        swapped[j] = swapped.get(i, i)
+
+
+class BigramIndex:
+    '''
+    Inverted index from each character bigram to the ids of the words that contain it.
+
+    Words are kept sorted by length, and a word id is the word’s position in that order.
+    Every posting list is therefore bucketed by length as well: the words of a given
+    length range are one contiguous slice of it, found by bisection.
+    '''
+
+    def __init__(self, words, postings=None, length_starts=None):
+        if postings is not None:
+            # Already built, e.g. read from a compiled index file
+            self.words = words
+            self.postings = postings
+            self.length_starts = length_starts
+            return
+        words = sorted(words, key=len)
+        self.words = words
+        # length_starts[n] is the id of the first word with at least n characters
+        self.length_starts = array('I')
+        for word_id, word in enumerate(words):
+            while len(self.length_starts) <= len(word):
+                self.length_starts.append(word_id)
+        self.length_starts.append(len(words))
+        postings = {}
+        for word_id, word in enumerate(words):
+            for bigram in {word[i:i + 2] for i in range(len(word) - 1)}:
+                try:
+                    postings[bigram].append(word_id)
+                except KeyError:
+                    postings[bigram] = [word_id]
+        # Plain lists of ints are expensive, so store each posting list as a compact array
+        self.postings = {bigram: array('I', ids) for bigram, ids in postings.items()}
+        # Same for the words: one UTF-8 buffer instead of a str object per word
+        self.words = CompiledWordList.from_words(words)
+
+    def id_range(self, min_length=0, max_length=0):
+        '''
+        Returns the (start, stop) word ids of the words with min_length to max_length characters.
+        0 means no limit.
+        '''
+
+        starts = self.length_starts
+        start = starts[min(min_length, len(starts) - 1)] if min_length else 0
+        stop = starts[min(max_length + 1, len(starts) - 1)] if max_length else len(self.words)
+        return start, max(start, stop)
+
+    def _in_range(self, word_ids, start, stop):
+        # Posting lists are sorted by id, so the range is one slice
+        return word_ids[bisect.bisect_left(word_ids, start):bisect.bisect_left(word_ids, stop)]
+
+    def find(self, search_string, min_length=0, max_length=0):
+        '''
+        Returns the ids of all words that contain search_string, in id order,
+        optionally only those with min_length to max_length characters.
+        '''
+
+        start, stop = self.id_range(min_length, max_length)
+        if len(search_string) == 2:
+            word_ids = self.postings.get(search_string, ())
+            if min_length or max_length:
+                word_ids = self._in_range(word_ids, start, stop)
+            return word_ids
+        if len(search_string) < 2:
+            # Pairs always have two characters; anything shorter isn’t a pair
+            return ()
+        # Longer strings: only check the words that contain its rarest bigram
+        bigrams = [search_string[i:i + 2] for i in range(len(search_string) - 1)]
+        rarest = min(bigrams, key=lambda bigram: len(self.postings.get(bigram, ())))
+        word_ids = self._in_range(self.postings.get(rarest, ()), start, stop)
+        return [word_id for word_id in word_ids if search_string in self.words[word_id]]
+
+    def find_candidates(self, search_string, mixed_case=False, min_length=0, max_length=0):
+        '''
+        Returns the ids of the words that contain search_string and, for mixed case pairs
+        (e.g. 'Ta'), also the words that start with it in lowercase, to be capitalized.
+        '''
+
+        word_ids = self.find(search_string, min_length, max_length)
+        if mixed_case:
+            lower_search = search_string.lower()
+            word_ids = list(word_ids) + self.starting_with(self.find(lower_search, min_length, max_length), lower_search)
+        return word_ids
+
+    def starting_with(self, word_ids, prefix):
+        '''
+        Returns the ids in word_ids of the words that start with prefix.
+        '''
+
+        if isinstance(self.words, CompiledWordList):
+            return self.words.ids_starting_with(word_ids, prefix)
+        return [word_id for word_id in word_ids if self.words[word_id].startswith(prefix)]
+
+    def iter_random(self, word_ids, rng=random):
+        '''
+        Yields the given word ids in random order, lazily.
+        '''
+
+        for i in iter_random_order(len(word_ids), rng):
+            yield word_ids[i]
+
+
+class CompositeCorpus:
+    '''
+    Searches several word lists at once through their own indexes, without copying them.
+    Words are drawn from each list in turn, so every language is sampled evenly,
+    and a word found in more than one list is only returned once.
+    '''
+
+    def __init__(self, indexes):
+        self.indexes = list(indexes)
+
+    def count(self, search_string, mixed_case=False, min_length=0, max_length=0):
+        '''
+        Returns how many words match search_string across all the word lists (duplicates included).
+        '''
+
+        return sum(len(index.find_candidates(search_string, mixed_case, min_length, max_length)) for index in self.indexes)
+
+    def iter_random(self, search_string, mixed_case=False, rng=random, min_length=0, max_length=0):
+        '''
+        Yields the words matching search_string (see BigramIndex.find_candidates) in random order.
+        '''
+
+        iterators = []
+        for index in self.indexes:
+            word_ids = index.find_candidates(search_string, mixed_case, min_length, max_length)
+            if len(word_ids):
+                iterators.append((index, index.iter_random(word_ids, rng)))
+        if len(iterators) > 1:
+            # Start the rotation at a random language, so the first one isn’t always favored
+            start = rng.randrange(len(iterators))
+            iterators = iterators[start:] + iterators[:start]
+
+        seen = set()
+        while iterators:
+            for entry in list(iterators):
+                index, word_ids = entry
+                for word_id in word_ids:
+                    word = index.words[word_id]
+                    if word not in seen:
+                        seen.add(word)
+                        yield word
+                        break
+                else:
+                    iterators.remove(entry)
+
+
+class WordCursor:
+    '''
+    Pages through a stream of words, such as CompositeCorpus.iter_random() with a seeded random.Random.
+    Words are only drawn as pages are asked for, so each page costs O(page size).
+    position is how many words have been handed out so far.
+    '''
+
+    def __init__(self, words):
+        self._words = iter(words)
+        self.position = 0
+        self.exhausted = False
+
+    def next_page(self, count):
+        '''
+        Returns the next count words, or fewer once the stream runs out.
+        '''
+
+        page = list(islice(self._words, count))
+        self.position += len(page)
+        if len(page) < count:
+            self.exhausted = True
+        return page
+
+    def skip(self, count):
+        '''
+        Moves past count words without keeping them.
+        '''
+
+        skipped = sum(1 for _ in islice(self._words, count))
+        self.position += skipped
+        if skipped < count:
+            self.exhausted = True
+
+
+# ========== Compiled word index files ========== #
+
+# File layout, all numbers in native byte order:
+#   header       _INDEX_HEADER, padded to 8 bytes
+#   offsets      word_count + 1 uint32 byte offsets into the blob
+#   lengths      length_count uint32: id of the first word with at least n characters, for each n
+#   bigrams      bigram_count × 4 uint32: first char, second char, postings start, postings length
+#   postings     posting_count uint32 word ids, grouped by bigram
+#   blob         every word, UTF-8, back to back
+
+INDEX_MAGIC = b'MM2SCIX2'
+INDEX_EXTENSION = '.mm2scidx'
+_BYTE_ORDER_MARK = 0x01020304
+_INDEX_HEADER = struct.Struct('=8sIIIIIQQd20s')
+_HEADER_SIZE = (_INDEX_HEADER.size + 7) // 8 * 8
+
+
+def hash_file(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fo:
+        for chunk in iter(lambda: fo.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class CompiledWordList(Sequence):
+    '''
+    Read-only list of words backed by a UTF-8 blob and an offsets table.
+    A str is only created when a word is actually asked for.
+
+    The blob and offsets are either memory-mapped from a compiled index file,
+    or built in memory by from_words().
+    '''
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_words(cls, words):
+        '''
+        Packs an iterable of words into one bytes buffer and an array('I') of offsets.
+        '''
+
+        offsets = array('I', [0])
+        blob = bytearray()
+        for word in words:
+            blob += word.encode('utf-8')
+            offsets.append(len(blob))
+        return cls(bytes(blob), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('word index out of range')
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def ids_starting_with(self, word_ids, prefix):
+        '''
+        Returns the ids in word_ids of the words that start with prefix, comparing bytes instead of decoding each word.
+        '''
+
+        encoded = prefix.encode('utf-8')
+        size = len(encoded)
+        blob, offsets = self.blob, self.offsets
+        return [i for i in word_ids if offsets[i + 1] - offsets[i] >= size and blob[offsets[i]:offsets[i] + size] == encoded]
+
+
+def compile_index(words, index_path, source_size=0, source_mtime=0.0, source_hash=b''):
+    '''
+    Writes a word list and its bigram postings to index_path, in the compiled index format.
+    '''
+
+    index = words if isinstance(words, BigramIndex) else BigramIndex(words)
+    compact = index.words if isinstance(index.words, CompiledWordList) else CompiledWordList.from_words(index.words)
+    write_index_file(index_path, array('I', compact.offsets), index.length_starts, index.postings, [compact.blob], source_size, source_mtime, source_hash)
+
+
+def compile_sorted_words(words, index_path, source_size=0, source_mtime=0.0, source_hash=b'', progress=None, run_size=4000000):
+    '''
+    Like compile_index, for words that are already unique and sorted by length, e.g. streamed
+    from a large corpus, in bounded memory. The words and their offsets go straight to temporary
+    files as they come in. At most run_size postings are held in memory; beyond that, they are
+    written out as runs, sorted by bigram, and merged at the end, calling progress(postings merged, total).
+    '''
+
+    folder = os.path.dirname(index_path)
+    length_starts = array('I')
+    postings = {}
+    held = 0
+    run_paths = []
+    posting_count = 0
+    position = 0
+    word_id = 0
+    offsets = array('I', [0])
+    try:
+        with tempfile.TemporaryFile(dir=folder) as blob_file, tempfile.TemporaryFile(dir=folder) as offsets_file:
+            for word in words:
+                while len(length_starts) <= len(word):
+                    length_starts.append(word_id)
+                for bigram in {word[i:i + 2] for i in range(len(word) - 1)}:
+                    word_ids = postings.get(bigram)
+                    if word_ids is None:
+                        word_ids = postings[bigram] = array('I')
+                    word_ids.append(word_id)
+                    held += 1
+                if held >= run_size:
+                    run_paths.append(write_posting_run(postings, folder))
+                    posting_count += held
+                    postings = {}
+                    held = 0
+                encoded = word.encode('utf-8')
+                blob_file.write(encoded)
+                position += len(encoded)
+                offsets.append(position)
+                if len(offsets) >= 1 << 16:
+                    offsets.tofile(offsets_file)
+                    offsets = array('I')
+                word_id += 1
+            length_starts.append(word_id)
+            offsets.tofile(offsets_file)
+            if run_paths and postings:
+                run_paths.append(write_posting_run(postings, folder))
+                posting_count += held
+                postings = {}
+
+            with tempfile.TemporaryFile(dir=folder) as postings_file:
+                if run_paths:
+                    bigrams = merge_posting_runs(run_paths, postings_file, posting_count, progress)
+                else:
+                    bigrams = array('I')
+                    for bigram in sorted(postings):
+                        bigrams.extend((ord(bigram[0]), ord(bigram[1]), posting_count, len(postings[bigram])))
+                        postings[bigram].tofile(postings_file)
+                        posting_count += len(postings[bigram])
+                    if progress is not None:
+                        progress(posting_count, posting_count)
+
+                sections = [iter_file_chunks(offsets_file), [length_starts, bigrams], iter_file_chunks(postings_file), iter_file_chunks(blob_file)]
+                write_index_sections(index_path, word_id, len(bigrams) // 4, posting_count, len(length_starts), position, sections, source_size, source_mtime, source_hash)
+    finally:
+        for path in run_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def write_posting_run(postings, temp_dir=None):
+    '''
+    Writes postings to a temporary file, sorted by bigram, as blocks of first character, second character, count and word ids.
+    '''
+
+    fd, path = tempfile.mkstemp(dir=temp_dir, suffix='.mm2scrun')
+    with os.fdopen(fd, 'wb') as fo:
+        for bigram in sorted(postings):
+            word_ids = postings[bigram]
+            array('I', (ord(bigram[0]), ord(bigram[1]), len(word_ids))).tofile(fo)
+            word_ids.tofile(fo)
+    return path
+
+
+def iter_posting_run(path):
+    with open(path, 'rb') as fo:
+        while True:
+            block = array('I')
+            try:
+                block.fromfile(fo, 3)
+            except EOFError:
+                return
+            word_ids = array('I')
+            word_ids.fromfile(fo, block[2])
+            yield (block[0], block[1]), word_ids
+
+
+def merge_posting_runs(run_paths, postings_file, posting_count, progress=None):
+    '''
+    Merges posting runs into postings_file, one bigram at a time, and returns the bigram table.
+    The runs were written in word id order, so a bigram’s ids from later runs just go after the earlier ones.
+    '''
+
+    bigrams = array('I')
+    done = 0
+    current = None
+    for bigram, word_ids in heapq.merge(*(iter_posting_run(path) for path in run_paths), key=lambda block: block[0]):
+        if bigram != current:
+            bigrams.extend((bigram[0], bigram[1], done, 0))
+            current = bigram
+        bigrams[-1] += len(word_ids)
+        word_ids.tofile(postings_file)
+        done += len(word_ids)
+        if progress is not None:
+            progress(done, posting_count)
+    return bigrams
+
+
+def iter_file_chunks(fo, chunk_size=1 << 20):
+    fo.seek(0)
+    return iter(lambda: fo.read(chunk_size), b'')
+
+
+def write_index_file(index_path, offsets, length_starts, postings, blob_chunks, source_size=0, source_mtime=0.0, source_hash=b''):
+    '''
+    Writes the parts of a compiled index to index_path. blob_chunks are the UTF-8 words, in any number of pieces.
+    '''
+
+    bigrams = array('I')
+    all_postings = array('I')
+    for bigram in sorted(postings):
+        word_ids = postings[bigram]
+        bigrams.extend((ord(bigram[0]), ord(bigram[1]), len(all_postings), len(word_ids)))
+        all_postings.extend(word_ids)
+
+    sections = [[offsets, length_starts, bigrams, all_postings], blob_chunks]
+    write_index_sections(index_path, len(offsets) - 1, len(bigrams) // 4, len(all_postings), len(length_starts), offsets[-1], sections, source_size, source_mtime, source_hash)
+
+
+def write_index_sections(index_path, word_count, bigram_count, posting_count, length_count, blob_size, sections, source_size=0, source_mtime=0.0, source_hash=b''):
+    '''
+    Writes a compiled index header and then sections, each any number of chunks (bytes or arrays):
+    the offsets, length starts, bigram table, postings and blob, in that order.
+    '''
+
+    header = _INDEX_HEADER.pack(INDEX_MAGIC, _BYTE_ORDER_MARK, word_count, bigram_count, posting_count, length_count, blob_size, source_size, source_mtime, source_hash)
+
+    # Write next to the final file and swap it in, so a half-written index is never opened
+    folder = os.path.dirname(index_path)
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix=INDEX_EXTENSION + '.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fo:
+            fo.write(header.ljust(_HEADER_SIZE, b'\0'))
+            for chunks in sections:
+                for chunk in chunks:
+                    fo.write(chunk)
+        os.replace(temp_path, index_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_index_header(index_path):
+    '''
+    Returns the header fields of a compiled index file as a dict, or None if it isn’t one we can read.
+    '''
+
+    try:
+        with open(index_path, 'rb') as fo:
+            data = fo.read(_INDEX_HEADER.size)
+    except OSError:
+        return None
+    if len(data) < _INDEX_HEADER.size:
+        return None
+    magic, mark, word_count, bigram_count, posting_count, length_count, blob_size, source_size, source_mtime, source_hash = _INDEX_HEADER.unpack(data)
+    if magic != INDEX_MAGIC or mark != _BYTE_ORDER_MARK:
+        return None
+    return dict(word_count=word_count, bigram_count=bigram_count, posting_count=posting_count, length_count=length_count, blob_size=blob_size, source_size=source_size, source_mtime=source_mtime, source_hash=source_hash)
+
+
+def update_index_source_stat(index_path, source_size, source_mtime):
+    '''
+    Rewrites the source file size and mtime in a compiled index’s header, in place, leaving the rest of the file as it is.
+    '''
+
+    with open(index_path, 'r+b') as fo:
+        fields = list(_INDEX_HEADER.unpack(fo.read(_INDEX_HEADER.size)))
+        fields[7:9] = [source_size, source_mtime]
+        fo.seek(0)
+        fo.write(_INDEX_HEADER.pack(*fields))
+
+
+def open_compiled_index(index_path):
+    '''
+    Memory-maps a compiled index file and returns it as a BigramIndex.
+    Nothing is parsed up front apart from the small bigram table.
+    '''
+
+    header = read_index_header(index_path)
+    if header is None:
+        raise ValueError(f'Not a compiled MM2SC word index: {index_path}')
+
+    with open(index_path, 'rb') as fo:
+        mapped = mmap.mmap(fo.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+
+    start = _HEADER_SIZE
+    offsets_end = start + 4 * (header['word_count'] + 1)
+    lengths_end = offsets_end + 4 * header['length_count']
+    bigrams_end = lengths_end + 16 * header['bigram_count']
+    postings_end = bigrams_end + 4 * header['posting_count']
+    if postings_end + header['blob_size'] != len(mapped):
+        raise ValueError(f'Compiled MM2SC word index is truncated: {index_path}')
+
+    offsets = view[start:offsets_end].cast('I')
+    length_starts = view[offsets_end:lengths_end].cast('I')
+    bigram_table = view[lengths_end:bigrams_end].cast('I')
+    all_postings = view[bigrams_end:postings_end].cast('I')
+    blob = view[postings_end:]
+
+    postings = {}
+    for i in range(0, len(bigram_table), 4):
+        first, second, posting_start, posting_length = bigram_table[i:i + 4]
+        postings[chr(first) + chr(second)] = all_postings[posting_start:posting_start + posting_length]
+
+    return BigramIndex(CompiledWordList(blob, offsets), postings=postings, length_starts=length_starts)
+
+
+def load_index(source_path, cache_dir=None):
+    '''
+    Returns the bigram index for a word list file.
+
+    The compiled index in cache_dir is used as long as it matches the source file’s
+    mtime and size, or failing that, its hash. Otherwise it is (re)compiled first.
+    Without a usable cache_dir, the index is built in memory.
+    '''
+
+    if cache_dir is None:
+        return BigramIndex(read_word_list(source_path))
+
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    index_path = os.path.join(cache_dir, name + INDEX_EXTENSION)
+    source_stat = os.stat(source_path)
+
+    header = read_index_header(index_path)
+    if header is not None:
+        if header['source_size'] == source_stat.st_size and header['source_mtime'] == source_stat.st_mtime:
+            return open_compiled_index(index_path)
+    source_hash = hash_file(source_path)
+    if header is not None and header['source_hash'] == source_hash:
+        # Same words, new mtime (e.g. after a reinstall): record it, so the file isn’t hashed again next time
+        try:
+            update_index_source_stat(index_path, source_stat.st_size, source_stat.st_mtime)
+        except OSError:
+            pass  # The index still works; it is just checked by hash again
+        return open_compiled_index(index_path)
+
+    index = BigramIndex(read_word_list(source_path))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        compile_index(index, index_path, source_stat.st_size, source_stat.st_mtime, source_hash)
+    except OSError as e:
+        print(f'MM2SC couldn’t write a word index to {cache_dir}: {e}')
+        return index
+    return open_compiled_index(index_path)
+
+
+# ========== Custom word lists ========== #
+
+# Letters, optionally joined by apostrophes or hyphens: "don’t", "well-known". Numbers are left out.
+WORD_PATTERN = re.compile(r"[^\W\d_]+(?:['’-][^\W\d_]+)*")
+MAX_WORD_LENGTH = 40  # Longer tokens are URLs, markup or other junk, not words
+
+
+def iter_text_chunks(path, chunk_size=1 << 20, progress=None):
+    '''
+    Yields a file’s text in pieces of about chunk_size bytes, each ending on whitespace,
+    so that no word is split. Works the same for one huge line as for many short ones.
+    progress(bytes read, file size) is called after every piece.
+    '''
+
+    total = os.path.getsize(path)
+    done = 0
+    carry = b''
+    with open(path, 'rb') as fo:
+        while True:
+            data = fo.read(chunk_size)
+            done += len(data)
+            if not data:
+                break
+            data = carry + data
+            cut = max(data.rfind(byte) for byte in (b' ', b'\n', b'\t', b'\r'))
+            if cut < 0:
+                # No whitespace in the whole chunk: not something we want to keep as a word
+                carry = b''
+                continue
+            carry = data[cut + 1:]
+            yield data[:cut + 1].decode('utf-8', 'replace')
+            if progress is not None:
+                progress(done, total)
+    if carry:
+        yield carry.decode('utf-8', 'replace')
+
+
+def iter_tokens(path, progress=None):
+    '''
+    Yields every word in a text file, in order, duplicates included.
+    '''
+
+    find_words = WORD_PATTERN.findall
+    for text in iter_text_chunks(path, progress=progress):
+        for word in find_words(text):
+            if len(word) <= MAX_WORD_LENGTH:
+                yield word
+
+
+def word_order(word):
+    return len(word), word
+
+
+def iter_unique_sorted(words, run_size=500000, temp_dir=None, progress=None):
+    '''
+    Yields the distinct words, sorted by length, then alphabetically.
+
+    At most run_size distinct words are held in memory. Beyond that, sorted runs are
+    written to temporary files and merged at the end, calling progress(words merged, total).
+    '''
+
+    run_paths = []
+    buffer = set()
+    total = 0
+    try:
+        for word in words:
+            buffer.add(word)
+            if len(buffer) >= run_size:
+                run_paths.append(write_sorted_run(buffer, temp_dir))
+                total += len(buffer)
+                buffer = set()
+        if not run_paths:
+            yield from sorted(buffer, key=word_order)
+            return
+        if buffer:
+            run_paths.append(write_sorted_run(buffer, temp_dir))
+            total += len(buffer)
+            buffer = set()
+        previous = None
+        for done, word in enumerate(heapq.merge(*(iter_sorted_run(path) for path in run_paths), key=word_order), 1):
+            if word != previous:
+                yield word
+                previous = word
+            if progress is not None and (done % 65536 == 0 or done == total):
+                progress(done, total)
+    finally:
+        for path in run_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def write_sorted_run(words, temp_dir=None):
+    fd, path = tempfile.mkstemp(dir=temp_dir, suffix='.mm2scrun')
+    with os.fdopen(fd, 'w', encoding='utf-8') as fo:
+        for word in sorted(words, key=word_order):
+            fo.write(word + '\n')
+    return path
+
+
+def iter_sorted_run(path):
+    with open(path, encoding='utf-8') as fo:
+        for line in fo:
+            yield line[:-1]
+
+
+def custom_index_path(source_path, cache_dir):
+    '''
+    Returns where the compiled index of a custom word list goes. Files with the same name in different folders get different indexes.
+    '''
+
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    path_hash = hashlib.sha1(os.path.abspath(source_path).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, f'custom-{name}-{path_hash}{INDEX_EXTENSION}')
+
+
+def load_custom_index(source_path, cache_dir=None, progress=None):
+    '''
+    Returns the bigram index for a custom word list or corpus: any UTF-8 text,
+    one word per line or running text, of any size.
+
+    Like load_index, the compiled index is reused while the file is unchanged. Otherwise
+    the file is tokenized, de-duplicated and indexed in one streaming pass, in bounded memory.
+    progress(done, total, stage) is called as it goes, for each stage in turn: 'reading' the file
+    (in bytes), 'sorting' the words (when there are too many to sort in memory) and 'indexing' their postings.
+    '''
+
+    cache_dir = cache_dir or tempfile.gettempdir()
+    index_path = custom_index_path(source_path, cache_dir)
+    source_stat = os.stat(source_path)
+
+    header = read_index_header(index_path)
+    if header is not None and header['source_size'] == source_stat.st_size and header['source_mtime'] == source_stat.st_mtime:
+        return open_compiled_index(index_path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    def stage_progress(stage):
+        if progress is None:
+            return None
+        return lambda done, total: progress(done, total, stage)
+
+    tokens = iter_tokens(source_path, stage_progress('reading'))
+    words = iter_unique_sorted(tokens, temp_dir=cache_dir, progress=stage_progress('sorting'))
+    # Hashing the whole file again isn’t worth it for a corpus this size; mtime and size decide
+    compile_sorted_words(words, index_path, source_stat.st_size, source_stat.st_mtime, progress=stage_progress('indexing'))
+    return open_compiled_index(index_path)
+
+
+class WordListStore:
+    '''
+    Lazily loaded word list indexes, keyed by text file name (e.g. 'ukacd').
+    Custom word lists are keyed by their path.
+    '''
+
+    def __init__(self, resources_dir=RESOURCES_DIR, cache_dir=default_cache_dir()):
+        self.resources_dir = resources_dir
+        self.cache_dir = cache_dir  # None: don’t compile indexes to disk
+        self._indexes = {}
+        self._custom_indexes = {}
+        self._lock = threading.Lock()
+        self._custom_lock = threading.Lock()  # Indexing a big corpus shouldn’t hold up the bundled lists
+
+    def path_for(self, name):
+        return os.path.join(self.resources_dir, name + '.txt')
+
+    def get_index(self, name):
+        '''
+        Returns the bigram index for a word list, building (or memory-mapping) it on first use.
+        '''
+
+        index = self._indexes.get(name)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._indexes.get(name)
+            if index is None:
+                index = load_index(self.path_for(name), self.cache_dir)
+                self._indexes[name] = index
+        return index
+
+    def get_custom_index(self, path, progress=None):
+        '''
+        Returns the index of a custom word list, indexing it first if needed (see load_custom_index).
+        '''
+
+        index = self._custom_indexes.get(path)
+        if index is not None:
+            return index
+        with self._custom_lock:
+            index = self._custom_indexes.get(path)
+            if index is None:
+                index = load_custom_index(path, self.cache_dir, progress)
+                self._custom_indexes[path] = index
+        return index
+
+    def is_custom_loaded(self, path):
+        return path in self._custom_indexes
+
+    def get_corpus(self, languages, custom_paths=()):
+        '''
+        Returns a CompositeCorpus over the given language indexes and custom word lists.
+        '''
+
+        indexes = [self.get_index(TEXT_FILES[language]) for language in languages]
+        indexes += [self.get_custom_index(path) for path in custom_paths]
+        return CompositeCorpus(indexes)
+
+    def is_loaded(self, name):
+        return name in self._indexes
+
+
+# The one store shared by every MM2SC_Tool instance
+word_lists = WordListStore()
@@ -0,0 +1,778 @@
+import time
+import zlib
+import random
+import threading
+from itertools import islice
+from collections import OrderedDict
+
+from mm2sc_corpus import word_lists, WordCursor
+from mm2sc_settings import Settings
+from mm2sc_timing import TimingRecorder
+from mm2sc_font import get_font_snapshot, get_kerning_resolver, get_width_engine
+
+
+'''
+The pair-to-text logic of MM2SpaceCenter: spacing strings, word search,
+open/close and mirrored contexts, for one font and one set of settings.
+
+It works with anything that looks enough like a font: iterating it gives glyphs
+with name, unicodes and width, and it has kerning and groups mappings. So the
+same engine runs in RoboFont (MM2SC_Hub is one), on a UFO read by mm2sc_ufo,
+or on a stand-in. This module doesn’t depend on mojo.
+'''
+
+
+def parse_bracket_pairs(text):
+    '''
+    Returns the (open, close) pairs in a string like '»« ⟨⟩': two characters each, separated by spaces.
+    '''
+
+    return tuple((token[0], token[1]) for token in text.split() if len(token) == 2)
+
+
+class OpenCloseTable:
+    '''
+    Open/close partners for one font, worked out once.
+
+    pairs_by_char maps every open or close character to the pairs it is in, with their precedence,
+    and each pair records whether its open and close are in the font. Partners with a glyph’s
+    suffix are looked up on first use and remembered, along with whether that glyph exists,
+    and so is the context of every glyph pair asked for.
+    '''
+
+    def __init__(self, pairs, snapshot, sc_string_for):
+        self.snapshot = snapshot
+        self.sc_string_for = sc_string_for
+        self.contexts = {}  # (left glyph name, right glyph name): open/close context
+        self.pairs_by_char = {}  # char: [(precedence, open, close, open in font, close in font)]
+        for i, (open_char, close_char) in enumerate(pairs):
+            entry = (i, open_char, close_char, snapshot.has_unicode(ord(open_char)), snapshot.has_unicode(ord(close_char)))
+            self.pairs_by_char.setdefault(open_char, []).append(entry)
+            if close_char != open_char:
+                self.pairs_by_char.setdefault(close_char, []).append(entry)
+        self._partners = {}  # (char, suffix): (Space Center string, whether the suffixed glyph exists)
+
+    def partner(self, char, suffix):
+        '''
+        Returns the Space Center string for char’s glyph with suffix, or for the plain glyph if the font doesn’t have the suffixed one.
+        '''
+
+        key = (char, suffix)
+        entry = self._partners.get(key)
+        if entry is None:
+            gname = self.snapshot.gname_for(char)
+            exists = self.snapshot.has_glyph(gname + suffix)
+            entry = self._partners[key] = (self.sc_string_for(gname + suffix if exists or not suffix else gname), exists)
+        return entry[0]
+
+    def resolve(self, left, right, l_sc, r_sc, l_suff='', r_suff=''):
+        '''
+        Returns the open/close context for a pair of characters, shown as l_sc and r_sc, or '' if there isn’t one.
+        The first pair (in order of precedence) that applies decides it.
+        '''
+
+        entries = self.pairs_by_char.get(left, []) + self.pairs_by_char.get(right, [])
+        for _, open_char, close_char, open_in_font, close_in_font in sorted(set(entries)):
+            if (open_char, close_char) == (left, right):
+                return l_sc + r_sc
+            elif (open_char, close_char) == (right, left):
+                return r_sc + l_sc
+            # Open and close
+            elif open_char == left and close_in_font:
+                return l_sc + r_sc + self.partner(close_char, l_suff)
+            elif close_char == right and open_in_font:
+                return self.partner(open_char, r_suff) + l_sc + r_sc
+            # Now close and open
+            elif open_char == right and close_in_font:
+                return self.partner(close_char, r_suff) + l_sc + r_sc
+            elif close_char == left and open_in_font:
+                return l_sc + r_sc + self.partner(open_char, l_suff)
+        return ''
+
+
+def compile_template(template):
+    '''
+    Returns a spacing context template, with __ where the pair goes, as the segments around the pair.
+    '''
+
+    return tuple(template.split('__'))
+
+
+def parse_char_set(text):
+    '''
+    Returns the characters in a string like 'А-яЁё', with ranges expanded and whitespace left out.
+    '''
+
+    chars = set()
+    text = ''.join(text.split())
+    i = 0
+    while i < len(text):
+        if i + 2 < len(text) and text[i + 1] == '-':
+            chars.update(map(chr, range(ord(text[i]), ord(text[i + 2]) + 1)))
+            i += 3
+        else:
+            chars.add(text[i])
+            i += 1
+    return frozenset(chars)
+
+
+def is_lowercase(gname, char):
+    return char != char.upper()
+
+
+class SpacingContext:
+    '''
+    A spacing context, with its template compiled.
+
+    match says which glyphs Auto picks the context for: a suffix like '.sc', a set of
+    characters like 'А-яЁё', a function of the glyph name and its character, or '' for none.
+    variants are (side of the pair, Space Center string, template): the template to use
+    instead when that side of the pair is that glyph, e.g. a fraction slash.
+    '''
+
+    def __init__(self, name, template, match='', variants=()):
+        self.name = name
+        self.template = template
+        self.segments = compile_template(template)
+        self.match = match
+        if callable(match):
+            self.matches = match
+        elif match.startswith('.'):
+            suffix = match[1:]
+            self.matches = lambda gname, char: suffix in gname.split('.')[1:]
+        else:
+            chars = parse_char_set(match)
+            self.matches = lambda gname, char: char in chars
+        self.variants = {(side, sc_string): compile_template(variant) for side, sc_string, variant in variants}
+
+    def render(self, l_sc, r_sc):
+        '''
+        Returns the context with the pair, shown as l_sc and r_sc, in every place it goes.
+        '''
+
+        segments = self.segments
+        if self.variants:
+            segments = self.variants.get((0, l_sc)) or self.variants.get((1, r_sc)) or segments
+        return (l_sc + r_sc).join(segments)
+
+
+def parse_spacing_contexts(text):
+    '''
+    Returns the SpacingContexts in a string with one per line, like 'Small caps (.sc): /h.sc /h.sc __/h.sc /o.sc __/o.sc /o.sc'.
+    The part in parentheses is optional, and says which glyphs Auto picks the context for.
+    Lines without a name or without __ in the template are left out.
+    '''
+
+    contexts = []
+    for line in text.splitlines():
+        head, colon, template = line.partition(':')
+        if not colon or '__' not in template:
+            continue
+        name, _, match = head.partition('(')
+        name = name.strip()
+        if name:
+            contexts.append(SpacingContext(name, template.lstrip(), match=match.strip().rstrip(')').strip()))
+    return tuple(contexts)
+
+
+class SpacingContextTable:
+    '''
+    Spacing contexts for one font, worked out once.
+
+    categories maps every glyph name to the first of auto_contexts that matches it; a
+    pair gets whichever of its two glyphs’ contexts comes first. Glyph names that aren’t
+    in the font are added on first use, and so is the spacing string of every pair asked for.
+    '''
+
+    def __init__(self, contexts, auto_contexts, fallback, snapshot, sc_string_for):
+        self.contexts = tuple(contexts)
+        self.auto_contexts = tuple(auto_contexts) + (fallback,)
+        self.snapshot = snapshot
+        self.sc_string_for = sc_string_for
+        self.strings = {}  # (pair, context setting): spacing string
+        self.categories = {gname: self.categorize(gname) for gname in snapshot.glyph_names}  # Glyph name: index into auto_contexts
+
+    def categorize(self, gname):
+        char = self.snapshot.char_for(gname.split('.')[0])
+        for i, context in enumerate(self.auto_contexts[:-1]):
+            if context.matches(gname, char):
+                return i
+        return len(self.auto_contexts) - 1
+
+    def category(self, gname):
+        category = self.categories.get(gname)
+        if category is None:
+            category = self.categories[gname] = self.categorize(gname)
+        return category
+
+    def auto_context(self, pair):
+        return self.auto_contexts[min(self.category(pair[0]), self.category(pair[1]))]
+
+    def sc_strings(self, pair):
+        return self.sc_string_for(pair[0]), self.sc_string_for(pair[1])
+
+
+class NoFont(Exception):
+    '''
+    Raised when a font lookup is asked for while the engine has no font.
+    '''
+
+
+def pair_seed(pair, salt=0):
+    '''
+    Returns a seed that only depends on the pair (and salt), the same in every session and process.
+    '''
+
+    return zlib.crc32(f'{salt}:{pair[0]}:{pair[1]}'.encode('utf-8'))
+
+
+class PairTextEngine:
+    '''
+    Makes the Space Center text for kerning pairs.
+
+    font may be None until set. fallback maps glyph names to unicodes for glyphs the font
+    doesn’t encode, e.g. RoboFont’s GN2UV. settings is a Settings object, word_store a
+    WordListStore, and timings a TimingRecorder that each run is recorded in.
+    '''
+
+    debug = False
+
+    def __init__(self, font=None, settings=None, word_store=word_lists, fallback=None, timings=None):
+        self.font = font
+        self.settings = settings if settings is not None else Settings()
+        self.dict_words = word_store
+        self.fallback = fallback
+        self.timings = timings if timings is not None else TimingRecorder()
+        self.pair_seeds = {}  # The seed each pair’s words were last drawn with, so later pages continue that order
+        self.cursors = OrderedDict()  # Open word cursors, most recently used last
+        self._cursors_lock = threading.Lock()
+        self._open_close_table = None  # (font snapshot, extra bracket pairs, OpenCloseTable)
+        self._spacing_context_table = None  # (font snapshot, user’s spacing contexts, SpacingContextTable)
+
+
+    def get_font(self):
+        '''
+        Returns the font, or raises NoFont if there isn’t one, e.g. after the last Space Center closed mid-computation.
+        '''
+
+        font = self.font
+        if font is None:
+            raise NoFont()
+        return font
+
+
+    def get_font_snapshot(self):
+        return get_font_snapshot(self.get_font(), self.fallback)
+
+
+    def get_kerning_resolver(self):
+        return get_kerning_resolver(self.get_font())
+
+
+    def get_width_engine(self):
+        # One font for all three, even if the font is let go in the meantime
+        font = self.get_font()
+        return get_width_engine(font, get_font_snapshot(font, self.fallback), get_kerning_resolver(font))
+
+
+    def sort_words_by_width(self, word_list):
+        '''
+        Sorts the list of words by width.
+        '''
+        return self.get_width_engine().sort_by_width(word_list)
+
+
+    def check_encoded(self, gname):
+        escape_set = {'slash'}  # 'backslash'
+        if gname in escape_set:
+            return False
+        return self.get_font_snapshot().is_encoded(gname)
+
+
+    def get_pair_in_chars(self, pair):
+        '''
+        Converts glyph names to characters, in order to find words in dictionary.
+        '''
+
+        def remove_suffix(gname):
+            '''
+            Removes the suffix from a glyph name.
+            '''
+            period_pos = gname.find('.')
+            return gname[:period_pos] if period_pos > 0 else gname
+        
+        try:
+            left_no_suffix = remove_suffix(pair[0])
+            right_no_suffix = remove_suffix(pair[1])
+            return self.get_pair_in_sc_strings((left_no_suffix, right_no_suffix))
+        except:
+            if self.debug: print('Couldn’t convert pair to chars.')
+            return pair
+
+
+    def get_pair_in_sc_strings(self, pair):
+        return self.get_sc_string_from_gname(pair[0]), self.get_sc_string_from_gname(pair[1])
+
+
+    def get_sc_string_from_gname(self, gname):
+        if not self.check_encoded(gname):
+            sc_string = '/' + gname + ' '
+        else:
+            sc_string = self.get_font_snapshot().gname_to_char[gname]
+        return sc_string 
+
+
+    def get_gname_from_char(self, char):
+        return self.get_font_snapshot().gname_for(char)
+
+
+    def get_char_from_gname(self, gname, no_suff=False):
+        if no_suff == True:
+            gname = gname.split(".")[0]
+        return self.get_font_snapshot().char_for(gname)
+
+
+    # The built-in spacing contexts, in the order the popover lists them (after Auto). __ is where the pair goes.
+    spacing_contexts = (
+        SpacingContext('Uppercase', 'HH__HO__OH__OO__HH'),
+        SpacingContext('Lowercase', 'nn__no__on__oo__nn', match=is_lowercase),
+        SpacingContext('Figures',   '11__10__01__00__11', match='0-9'),
+        # Fraction contexts probably need some love.
+        SpacingContext('Fractions', '11__/10/__01__/00/__11', variants=[
+            (0, '⁄', '11/eight.numr __10/one.numr __00'),    # Fraction at the start of the pair
+            (1, '⁄', '11__/eight.dnom 10__/eight.dnom 00'),  # Fraction at the end of the pair
+        ]),
+    )
+    # After the user’s contexts, Auto tries these in order, and falls back to Uppercase
+    auto_spacing_contexts = ('Figures', 'Lowercase')
+    fallback_spacing_context = 'Uppercase'
+
+    def get_spacing_context_table(self):
+        '''
+        Returns the SpacingContextTable for the font and the user’s spacing contexts.
+        It is rebuilt when the font snapshot is, i.e. when glyphs or unicodes change, or when the user’s contexts do.
+        '''
+
+        snapshot = self.get_font_snapshot()
+        text = self.settings.spacingContexts
+        cached = self._spacing_context_table
+        if cached is not None and cached[0] is snapshot and cached[1] == text:
+            return cached[2]
+        user_contexts = parse_spacing_contexts(text)
+        built_in = {context.name: context for context in self.spacing_contexts}
+        # The user’s contexts come first, so they win over the built-in ones
+        auto_contexts = [context for context in user_contexts if context.match] + [built_in[name] for name in self.auto_spacing_contexts]
+        table = SpacingContextTable(self.spacing_contexts + user_contexts, auto_contexts, built_in[self.fallback_spacing_context], snapshot, self.get_sc_string_from_gname)
+        self._spacing_context_table = (snapshot, text, table)
+        return table
+
+
+    def get_spacing_context_names(self):
+        '''
+        Returns the names of the built-in spacing contexts and the user’s. The context setting is 1 + an index into them, or 0 for Auto.
+        '''
+
+        return [context.name for context in self.spacing_contexts + parse_spacing_contexts(self.settings.spacingContexts)]
+
+
+    def make_spacing_string(self, pair):
+        '''
+        Returns the pair within the selected spacing context, or within the one Auto picks for it.
+        '''
+
+        table = self.get_spacing_context_table()
+        context = self.settings.context
+        key = (pair, context)
+        string = table.strings.get(key)
+        if string is None:
+            if 0 < context <= len(table.contexts):
+                spacing_context = table.contexts[context - 1]
+            else:
+                spacing_context = table.auto_context(pair)
+            string = table.strings[key] = spacing_context.render(*table.sc_strings(pair)) + '\\n'
+        return string
+
+
+    # Can delete all the close/open duplicates of open/close
+    open_close_pairs = {
+        # Initial/final punctuation (from https://www.compart.com/en/unicode/category/Pi and https://www.compart.com/en/unicode/category/Pf)
+        "’": "‘",
+        # "„": "“",
+        # "„": "”",
+        "‘": "’",
+        "‛": "’",
+        "“": "”",
+        "‟": "”",
+        "‹": "›",
+        # "›": "‹",
+        "«": "»",
+        # "»": "«",
+        "⸂": "⸃",
+        "⸄": "⸅",
+        "⸉": "⸊",
+        "⸌": "⸍",
+        "⸜": "⸝",
+        "⸠": "⸡",
+        #"”": "”",  # These will make two contexts show up for quotes so leaving them off for now
+        #"’": "’",
+
+        # Miscellaneous but common open/close pairs
+        "'": "'",
+        '"': '"',
+        "¡": "!",
+        "¿": "?",
+        "←": "→",
+        # "→": "←",
+        "/": "\\",
+        
+        "<": ">",  # less, greater
+        # ">": "<",  # greater, less
+
+        # Opening/closing punctuation (from https://www.compart.com/en/unicode/category/Ps & https://www.compart.com/en/unicode/category/Pe)
+        "(": ")",
+        "[": "]",
+        "{": "}",
+        "༺": "༻", "༼": "༽", "᚛": "᚜", "‚": "‘", "⁅": "⁆", "⁽": "⁾", "₍": "₎", "⌈": "⌉", "⌊": "⌋", "〈": "〉", "❨": "❩", "❪": "❫", "❬": "❭", "❮": "❯", "❰": "❱", "❲": "❳", "❴": "❵", "⟅": "⟆", "⟦": "⟧", "⟨": "⟩", "⟪": "⟫", "⟬": "⟭", "⟮": "⟯", "⦃": "⦄", "⦅": "⦆", "⦇": "⦈", "⦉": "⦊", "⦋": "⦌", "⦍": "⦎", "⦏": "⦐", "⦑": "⦒", "⦓": "⦔", "⦕": "⦖", "⦗": "⦘", "⧘": "⧙", "⧚": "⧛", "⧼": "⧽", "⸢": "⸣", "⸤": "⸥", "⸦": "⸧", "⸨": "⸩", "〈": "〉", "《": "》", "「": "」", "『": "』", "【": "】", "〔": "〕", "〖": "〗", "〘": "〙", "〚": "〛", "〝": "〞", "⹂": "〟", "﴿": "﴾", "︗": "︘", "︵": "︶", "︷": "︸", "︹": "︺", "︻": "︼", "︽": "︾", "︿": "﹀", "﹁": "﹂", "﹃": "﹄", "﹇": "﹈", "﹙": "﹚", "﹛": "﹜", "﹝": "﹞", "（": "）", "［": "］", "｛": "｝", "｟": "｠", "｢": "｣",
+    }
+
+    def get_open_close_table(self):
+        '''
+        Returns the OpenCloseTable for the font and the user’s extra bracket pairs.
+        It is rebuilt when the font snapshot is, i.e. when glyphs or unicodes change.
+        '''
+
+        snapshot = self.get_font_snapshot()
+        extra_pairs = parse_bracket_pairs(self.settings.bracketPairs)
+        cached = self._open_close_table
+        if cached is not None and cached[0] is snapshot and cached[1] == extra_pairs:
+            return cached[2]
+        # The user’s pairs come first, so they win over the built-in ones
+        table = OpenCloseTable(list(extra_pairs) + list(self.open_close_pairs.items()), snapshot, self.get_sc_string_from_gname)
+        self._open_close_table = (snapshot, extra_pairs, table)
+        return table
+
+
+    def get_suffix(self, gname, sc_string):
+        '''
+        Returns the suffix of an unencoded glyph (e.g. '.sc'), to give its open/close partner the same one.
+        '''
+
+        if '.' in sc_string:
+            return '.' + '.'.join(gname.split('.')[1:])
+        return ''
+
+
+    def make_open_close_context(self, pair):
+        '''
+        Returns a string of the pair within an open/close context, to judge the symmetry of open/close kerns.
+        '''
+
+        table = self.get_open_close_table()
+        context = table.contexts.get(pair)
+        if context is not None:
+            return context
+
+        # Left and right, to look up in the table
+        left_search, right_search = self.get_char_from_gname(pair[0], no_suff=True), self.get_char_from_gname(pair[1], no_suff=True)
+
+        # Stop if the glyphs aren't open/close
+        if left_search not in table.pairs_by_char and right_search not in table.pairs_by_char:
+            table.contexts[pair] = ''
+            return ''
+
+        # Left and right, to add to the Space Center
+        l_sc, r_sc  = self.get_sc_string_from_gname(pair[0]), self.get_sc_string_from_gname(pair[1])
+        if self.debug: print('MM2SC open/close info:', pair, l_sc, r_sc)
+
+        open_close_string = table.resolve(left_search, right_search, l_sc, r_sc, self.get_suffix(pair[0], l_sc), self.get_suffix(pair[1], r_sc))
+        table.contexts[pair] = open_close_string + ' '
+
+        if self.debug: print('Open/close string:', open_close_string)
+        return open_close_string + ' '
+           
+
+    def make_mirrored_pair(self, pair):
+        '''
+        Returns a string of the pair mirrored, to judge the symmetry of kerns.
+        '''
+
+        left, right = self.get_pair_in_sc_strings(pair)
+        return left + right + left + right + ' ' 
+
+
+    def get_corpus(self):
+        '''
+        Returns the word lists to search: the selected languages, and the custom word list once it has been indexed.
+        '''
+
+        languages = self.settings.languages
+        custom_path = self.settings.customWordList
+        if custom_path and self.dict_words.is_custom_loaded(custom_path):
+            if self.settings.customWordListOnly:
+                languages = ()
+            return self.dict_words.get_corpus(languages, [custom_path])
+        return self.dict_words.get_corpus(languages)
+
+
+    def get_search_info(self, pair):
+        '''
+        Returns the pair’s characters, the string to search the word lists for,
+        whether the words should be made uppercase, and whether the pair is mixed case.
+        The search string is '' if either side has no character, as no word can have the pair then.
+        '''
+
+        # Convert MM tuple into search pair to check uc, lc, mixed case
+        pair_chars = self.get_pair_in_chars(pair)
+        pair_to_char_string = ''.join(pair_chars)
+
+        # Search for non-suffixed
+        left_char, right_char = (self.get_char_from_gname(gname, no_suff=True) for gname in pair)
+        # Otherwise an unencoded side (e.g. f_f) would leave a one-character search, matching unrelated words
+        search_string = left_char + right_char if left_char and right_char else ''
+
+        # Check if string is uppercase
+        if pair_to_char_string.isupper():
+            make_upper = True
+            search_string = search_string.lower()
+        else:
+            make_upper = False
+
+        # Check for mixed case
+        mixed_case = False
+        is_left_encoded = self.check_encoded(pair[0])
+        is_right_encoded = self.check_encoded(pair[1])
+        if pair_chars[0].isupper() and pair_chars[1].islower() and is_left_encoded and is_right_encoded:
+            mixed_case = True
+
+        return pair_to_char_string, search_string, make_upper, mixed_case
+
+
+    def iter_words(self, corpus, search_string, mixed_case, rng=random, min_length=0, max_length=0):
+        '''
+        Yields the words from the corpus that contain search_string, in random order and each only once.
+        For mixed case pairs, lowercase words starting with the pair are capitalized.
+        '''
+
+        # Length limits are applied by the index, so only words of the right length are looked at
+        candidates = corpus.iter_random(search_string, mixed_case, rng=rng, min_length=min_length, max_length=max_length)
+
+        word_set = set()
+        for word in candidates:
+            if search_string in word and word not in word_set:
+                word_set.add(word)
+                yield word
+
+            # Try capitalizing lowercase words
+            elif mixed_case and search_string.lower() in word[:2]:
+                word = word.capitalize()
+                if word not in word_set:
+                    word_set.add(word)
+                    yield word
+
+
+    def collect_words(self, corpus, search_string, mixed_case, word_count, min_length=0, max_length=0, rng=random):
+        '''
+        Returns up to word_count random words from the corpus that contain search_string.
+        '''
+
+        return list(islice(self.iter_words(corpus, search_string, mixed_case, rng, min_length, max_length), word_count))
+
+
+    # How many word cursors are kept open for paging
+    max_cursors = 16
+
+    def choose_seed(self, pair):
+        '''
+        Returns the seed for a pair’s word order: fixed per pair if stableSeed is on, otherwise a new one every time.
+        '''
+
+        if self.settings.stableSeed:
+            return pair_seed(pair)
+        return random.getrandbits(32)
+
+
+    def get_word_page(self, corpus, search_string, mixed_case, seed, page, word_count, min_length=0, max_length=0):
+        '''
+        Returns page number page of the words that contain search_string, in the order given by seed.
+
+        Going through the pages one after another continues one cursor, so each page costs O(word_count).
+        Past the last page, the pages start over from the first.
+        '''
+
+        key = (tuple(id(index) for index in corpus.indexes), search_string, mixed_case, seed, word_count, min_length, max_length)
+        start = page * word_count
+        # The lock is only held to take the cursor out and put it back, so searches on other threads don’t wait for this one
+        with self._cursors_lock:
+            cursor = self.cursors.pop(key, None)
+        if cursor is None or cursor.position > start:
+            words = self.iter_words(corpus, search_string, mixed_case, random.Random(seed), min_length, max_length)
+            cursor = WordCursor(words)
+        cursor.skip(start - cursor.position)
+        word_list = cursor.next_page(word_count)
+
+        # Wrap around: the cursor has now counted every word there is
+        if not word_list and start and cursor.position:
+            page_count = -(-cursor.position // word_count)
+            cursor = WordCursor(self.iter_words(corpus, search_string, mixed_case, random.Random(seed), min_length, max_length))
+            cursor.skip(page % page_count * word_count)
+            word_list = cursor.next_page(word_count)
+
+        with self._cursors_lock:
+            self.cursors[key] = cursor
+            while len(self.cursors) > self.max_cursors:
+                self.cursors.popitem(last=False)
+        return word_list
+
+
+    # Seconds the kern group fallback may spend looking for a substitute pair
+    group_fallback_time_budget = 0.05
+
+    def get_group_members(self, gname, side_groups):
+        '''
+        Returns the members of the kern group a glyph (or the group itself) is on one side of.
+        '''
+
+        resolver = self.get_kerning_resolver()
+        group_name = gname if gname in resolver.group_members else side_groups.get(gname)
+        if group_name is None:
+            return ()
+        return resolver.group_members[group_name]
+
+
+    def find_group_substitute(self, pair, corpus, min_length=0, max_length=0):
+        '''
+        Returns another pair from the same kern groups that does have words, or None.
+
+        Pairs keeping one side of the original are tried before pairs that change both.
+        Within those, the pair with the most words wins. Gives up after group_fallback_time_budget.
+        '''
+
+        resolver = self.get_kerning_resolver()
+        left, right = pair
+        left_members = [gname for gname in self.get_group_members(left, resolver.left_groups) if gname != left]
+        right_members = [gname for gname in self.get_group_members(right, resolver.right_groups) if gname != right]
+        tiers = [
+            [(left, r) for r in right_members] + [(l, right) for l in left_members],
+            [(l, r) for l in left_members for r in right_members],
+        ]
+
+        deadline = time.monotonic() + self.group_fallback_time_budget
+        word_counts = {}  # Member pairs often share the same search string
+        for tier in tiers:
+            best_pair, best_count = None, 0
+            for candidate in tier:
+                if time.monotonic() > deadline:
+                    break
+                search_info = self.get_search_info(candidate)
+                if not search_info[1]:
+                    continue
+                key = search_info[1:]
+                if key not in word_counts:
+                    word_counts[key] = corpus.count(search_info[1], search_info[3], min_length, max_length)
+                if word_counts[key] > best_count:
+                    best_pair, best_count = candidate, word_counts[key]
+            if best_pair is not None:
+                if self.debug: print('MM2SC group fallback:', pair, '→', best_pair, best_count)
+                return best_pair
+        return None
+
+
+    def make_text_for_pair(self, pair, is_stale=None, seed=None, page=0, timings=None):
+        '''
+        Generates all output text for a pair.
+        Returns None if is_stale() turns True along the way, i.e. a newer pair came in,
+        or if the font is let go along the way, as happens when the last Space Center closes.
+        The run is recorded in timings, or in self.timings if that is None.
+
+        The words are page number page of the pair’s words in the order given by seed;
+        with no seed, one is chosen (see choose_seed) and kept in pair_seeds for the next pages.
+        '''
+
+        try:
+            return self._make_text_for_pair(pair, is_stale, seed, page, timings)
+        except NoFont:
+            return None
+
+
+    def _make_text_for_pair(self, pair, is_stale, seed, page, timings):
+        # Settings are already validated and held in memory
+        word_count         = self.settings.wordCount
+        min_length         = self.settings.minLength
+        max_length         = self.settings.maxLength
+        all_uppercase      = self.settings.allUppercase
+        list_output        = self.settings.listOutput
+        mirrored_pair      = self.settings.mirroredPair
+        open_close_context = self.settings.openCloseContext
+
+        if seed is None:
+            seed = self.choose_seed(pair)
+        self.pair_seeds[pair] = seed
+
+        timing = (timings if timings is not None else self.timings).start('/'.join(pair))
+        
+        # Try getting pair_string once in order to check if encoded
+        pair_string = ''.join(list(self.get_pair_in_sc_strings(pair)))
+
+        # Get the spacing string
+        spacing_string = self.make_spacing_string(pair)
+        timing.lap('spacing')
+
+        pair_to_char_string, search_string, make_upper, mixed_case = self.get_search_info(pair)
+
+        # Only look at the words that contain the pair, via each word list’s bigram index
+        corpus = self.get_corpus()
+        word_list = self.get_word_page(corpus, search_string, mixed_case, seed, page, word_count, min_length, max_length) if search_string else []
+
+        # If no word has the pair, try the other members of its kern groups
+        substitute_pair = None
+        if not word_list:
+            substitute_pair = self.find_group_substitute(pair, corpus, min_length, max_length)
+            if substitute_pair is not None:
+                pair_to_char_string, search_string, make_upper, mixed_case = self.get_search_info(substitute_pair)
+                word_list = self.get_word_page(corpus, search_string, mixed_case, seed, page, word_count, min_length, max_length)
+        timing.lap('search')
+
+        if is_stale is not None and is_stale():
+            return None
+
+        if all_uppercase or make_upper:
+            # Make text uppercase again
+            word_list = [text.upper() for text in word_list]
+
+        words_text = ''
+        # If there are sample words
+        if word_list:
+            if list_output: # If 'Output as list' is checked:
+                timing.lap('format')
+                sorted_text = self.sort_words_by_width(word_list)
+                timing.lap('sort')
+                words_text = '\\n'.join(map(str, sorted_text))
+            else:
+                words_text = ' '.join(map(str, word_list))
+
+            words_text = words_text.lstrip()
+            words_text = words_text.replace(pair_to_char_string, '/'+'/'.join(substitute_pair or pair)+' ' )
+            if substitute_pair is not None:
+                substitute_string = ''.join(self.get_pair_in_sc_strings(substitute_pair))
+                words_text = f'Words for {substitute_string} (kern group of {pair_string}): ' + words_text
+        # If there are no sample words, add some failure text in the place of words text.
+        else:
+            words_text = f'There are no words for pair: {pair_string}'
+        timing.lap('format')
+            
+        # If you want your pair mirrored
+        mirror_text = ''
+        if mirrored_pair:
+            mirror_text = self.make_mirrored_pair(pair)
+            timing.lap('mirror')
+
+        # If you want your pair in an open/close context
+        open_close_text = ''
+        if open_close_context:
+            open_close_text = self.make_open_close_context(pair)
+            timing.lap('open_close')
+
+        text = ' '.join([mirror_text, open_close_text, spacing_string]) + words_text
+        text = text.lstrip()
+        timing.finish()
+        return text
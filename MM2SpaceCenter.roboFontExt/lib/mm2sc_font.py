@@ -0,0 +1,498 @@
+import weakref
+from itertools import chain
+
+
+'''
+Font-derived lookups for MM2SpaceCenter.
+
+Everything here is built once per font and cached, so the hot paths of
+words_for_pair() don’t have to walk the font or the glyph-name tables.
+This module doesn’t depend on mojo, so it can be used outside of RoboFont.
+'''
+
+
+# numpy takes a while to import, so it is only imported once the first width engine is built
+numpy = None
+_numpy_imported = False
+
+def import_numpy():
+    '''
+    Imports numpy on first use. Returns the module, or None if it isn’t installed.
+    '''
+
+    global numpy, _numpy_imported
+    if not _numpy_imported:
+        try:
+            import numpy as numpy_module
+        except ImportError:
+            numpy_module = None
+        numpy = numpy_module
+        _numpy_imported = True
+    return numpy
+
+
+def get_naked(font):
+    '''
+    Returns the object that stays the same for a font, however many fontParts wrappers are made for it.
+    '''
+
+    try:
+        return font.naked()
+    except AttributeError:
+        return font
+
+
+_reversed_tables = {}
+
+def reverse_glyph_name_table(table):
+    '''
+    Returns a unicode → glyph name dict for a glyph name → unicode table such as GN2UV.
+    Where several names share a unicode, the first one wins. Built once per table.
+    '''
+
+    reversed_table = _reversed_tables.get(id(table))
+    if reversed_table is None:
+        reversed_table = {}
+        for gname, uni in table.items():
+            reversed_table.setdefault(uni, gname)
+        _reversed_tables[id(table)] = reversed_table
+    return reversed_table
+
+
+class FontSnapshot:
+    '''
+    The glyph names and unicodes of one font, read once.
+
+    Holds the glyph name set, the unicode set and a two-way character ↔ glyph name map.
+    The font’s own cmap is used first, then the fallback glyph name → unicode table (e.g. GN2UV).
+    '''
+
+    def __init__(self, font, fallback=None):
+        self.glyph_names = set()
+        self.unicodes = set()
+        self.gname_to_char = {}  # Encoded glyphs only, to their first unicode
+        self.char_to_gname = {}
+        for glyph in font:
+            self.glyph_names.add(glyph.name)
+            unicodes = glyph.unicodes
+            if unicodes:
+                self.unicodes.update(unicodes)
+                self.gname_to_char[glyph.name] = chr(unicodes[0])
+                for uni in unicodes:
+                    self.char_to_gname.setdefault(chr(uni), glyph.name)
+
+        self.fallback = fallback if fallback is not None else {}
+        self.fallback_reversed = reverse_glyph_name_table(self.fallback)
+
+    def has_glyph(self, gname):
+        return gname in self.glyph_names
+
+    def has_unicode(self, uni):
+        return uni in self.unicodes
+
+    def is_encoded(self, gname):
+        return gname in self.gname_to_char
+
+    def char_for(self, gname):
+        '''
+        Returns the character for a glyph name, or '' if it doesn’t have one.
+        '''
+
+        char = self.gname_to_char.get(gname)
+        if char is not None:
+            return char
+        uni = self.fallback.get(gname)
+        return chr(uni) if uni is not None else ''
+
+    def gname_for(self, char):
+        '''
+        Returns the glyph name for a character, or '' if there isn’t one.
+        '''
+
+        gname = self.char_to_gname.get(char)
+        if gname is not None:
+            return gname
+        try:
+            uni = ord(char)
+        except TypeError:
+            return ''
+        return self.fallback_reversed.get(uni, '')
+
+
+_font_snapshots = weakref.WeakKeyDictionary()
+
+def get_font_snapshot(font, fallback=None):
+    '''
+    Returns the cached FontSnapshot for a font, building it if needed.
+    '''
+
+    key = get_naked(font)
+    snapshot = _font_snapshots.get(key)
+    if snapshot is None:
+        snapshot = FontSnapshot(font, fallback)
+        _font_snapshots[key] = snapshot
+    return snapshot
+
+
+def invalidate_font_snapshot(font):
+    '''
+    Forgets a font’s FontSnapshot, e.g. after glyphs were added or removed, or unicodes changed.
+    '''
+
+    _font_snapshots.pop(get_naked(font), None)
+
+
+# Kerning group prefixes for each side: UFO3 first, then MetricsMachine’s UFO2 style
+LEFT_GROUP_PREFIXES = ('public.kern1.', '@MMK_L_')
+RIGHT_GROUP_PREFIXES = ('public.kern2.', '@MMK_R_')
+
+
+class KerningResolver:
+    '''
+    Flattened kerning lookup for one font.
+
+    Keeps glyph → left group and glyph → right group maps, so that get() applies
+    the UFO kerning lookup order (glyph-glyph, glyph-group, group-glyph, group-group)
+    with a few dict lookups. The set_/delete_ methods update it in place.
+    '''
+
+    def __init__(self, font):
+        self.kerning = dict(font.kerning.items())
+        self.rebuild_groups(font.groups)
+
+    def rebuild_groups(self, groups):
+        self.group_members = {}
+        self.left_groups = {}
+        self.right_groups = {}
+        for group_name, members in groups.items():
+            self.set_group(group_name, members)
+
+    def set_group(self, group_name, members):
+        if group_name.startswith(LEFT_GROUP_PREFIXES):
+            side_groups = self.left_groups
+        elif group_name.startswith(RIGHT_GROUP_PREFIXES):
+            side_groups = self.right_groups
+        else:
+            return
+        self.delete_group(group_name)
+        self.group_members[group_name] = tuple(members)
+        for gname in members:
+            side_groups.setdefault(gname, group_name)
+
+    def delete_group(self, group_name):
+        members = self.group_members.pop(group_name, ())
+        for side_groups in (self.left_groups, self.right_groups):
+            for gname in members:
+                if side_groups.get(gname) == group_name:
+                    del side_groups[gname]
+
+    def set_pair(self, pair, value):
+        self.kerning[pair] = value
+
+    def delete_pair(self, pair):
+        self.kerning.pop(pair, None)
+
+    def get(self, left, right):
+        '''
+        Returns the kerning value between two glyph names, or 0.
+        '''
+
+        kerning = self.kerning
+        value = kerning.get((left, right))
+        if value is not None:
+            return value
+        left_group = self.left_groups.get(left)
+        right_group = self.right_groups.get(right)
+        if right_group is not None:
+            value = kerning.get((left, right_group))
+            if value is not None:
+                return value
+        if left_group is not None:
+            value = kerning.get((left_group, right))
+            if value is not None:
+                return value
+            if right_group is not None:
+                value = kerning.get((left_group, right_group))
+                if value is not None:
+                    return value
+        return 0
+
+
+_kerning_resolvers = weakref.WeakKeyDictionary()
+
+def get_kerning_resolver(font):
+    '''
+    Returns the cached KerningResolver for a font, building it if needed.
+    '''
+
+    key = get_naked(font)
+    resolver = _kerning_resolvers.get(key)
+    if resolver is None:
+        resolver = KerningResolver(font)
+        _kerning_resolvers[key] = resolver
+    return resolver
+
+
+def get_existing_kerning_resolver(font):
+    '''
+    Returns the font’s KerningResolver only if one has been built already.
+    '''
+
+    return _kerning_resolvers.get(get_naked(font))
+
+
+def invalidate_kerning_resolver(font):
+    _kerning_resolvers.pop(get_naked(font), None)
+
+
+# Above this many left × right classes, class kerning is looked up in a sorted table rather than a dense matrix
+MAX_DENSE_CLASS_CELLS = 1 << 20
+
+
+class WidthEngine:
+    '''
+    Batch word widths for one font.
+
+    Glyph advances are held in an array indexed by glyph id, and kerning as a
+    left class × right class matrix plus a sparse table of glyph-level exceptions.
+    Each glyph belongs to its kerning group’s class, to a class of its own if it is
+    kerned as a glyph, or to class 0 (no kerning). The widths of many words are then
+    computed in one vectorized pass when numpy is available, in plain Python otherwise.
+    '''
+
+    def __init__(self, font, snapshot, kerning):
+        import_numpy()
+        self.snapshot = snapshot
+        self.char_ids = {}
+
+        # Glyph id 0 stands in for characters that aren’t in the font
+        self.glyph_ids = {}
+        advances = [0]
+        for glyph in font:
+            self.glyph_ids[glyph.name] = len(advances)
+            advances.append(glyph.width)
+        glyph_count = len(advances)
+
+        # Kerning classes for each side. Class 0 has no kerning.
+        self.left_keys = {}
+        self.right_keys = {}
+        left_class = [0] * glyph_count
+        right_class = [0] * glyph_count
+        for group_name, members in kerning.group_members.items():
+            side_keys, side_class = (self.left_keys, left_class) if group_name.startswith(LEFT_GROUP_PREFIXES) else (self.right_keys, right_class)
+            class_id = side_keys.setdefault(group_name, len(side_keys) + 1)
+            for gname in members:
+                glyph_id = self.glyph_ids.get(gname)
+                if glyph_id is not None and side_class[glyph_id] == 0:
+                    side_class[glyph_id] = class_id
+
+        cells = {}
+        exception_keys = []
+        for (left, right), value in kerning.kerning.items():
+            if left in kerning.left_groups or right in kerning.right_groups:
+                # A grouped glyph kerned on its own: expanded into glyph pairs below
+                exception_keys.append((left, right))
+                continue
+            left_id = self._class_for_key(left, self.left_keys, left_class, kerning)
+            right_id = self._class_for_key(right, self.right_keys, right_class, kerning)
+            if left_id and right_id:
+                cells[left_id, right_id] = value
+
+        exceptions = {}
+        for left, right in exception_keys:
+            for left_gname in kerning.group_members.get(left, (left,)):
+                for right_gname in kerning.group_members.get(right, (right,)):
+                    left_id = self.glyph_ids.get(left_gname)
+                    right_id = self.glyph_ids.get(right_gname)
+                    if left_id is not None and right_id is not None:
+                        exceptions[left_id, right_id] = kerning.get(left_gname, right_gname)
+
+        self.glyph_count = glyph_count
+        self.left_class_count = len(self.left_keys) + 1
+        self.right_class_count = len(self.right_keys) + 1
+        self.cells = cells
+        self.exceptions = exceptions
+        self.advances = advances
+        self.left_class = left_class
+        self.right_class = right_class
+        self._build_arrays()
+
+    def _class_for_key(self, key, side_keys, side_class, kerning):
+        '''
+        Returns the class id for a kerning key (a group or an ungrouped glyph),
+        giving ungrouped glyphs a class of their own on first use. 0 if it can’t be kerned.
+        '''
+
+        class_id = side_keys.get(key)
+        if class_id is not None:
+            return class_id
+        if key.startswith(LEFT_GROUP_PREFIXES + RIGHT_GROUP_PREFIXES) and key not in kerning.group_members:
+            return 0
+        glyph_id = self.glyph_ids.get(key)
+        if glyph_id is None:
+            return 0
+        class_id = side_keys[key] = len(side_keys) + 1
+        side_class[glyph_id] = class_id
+        return class_id
+
+    def _build_arrays(self):
+        if numpy is None:
+            return
+        self.advance_array = numpy.array(self.advances, dtype=numpy.float64)
+        self.left_class_array = numpy.array(self.left_class, dtype=numpy.int64)
+        self.right_class_array = numpy.array(self.right_class, dtype=numpy.int64)
+
+        if self.left_class_count * self.right_class_count <= MAX_DENSE_CLASS_CELLS:
+            self.class_matrix = numpy.zeros((self.left_class_count, self.right_class_count), dtype=numpy.float64)
+            for (left_id, right_id), value in self.cells.items():
+                self.class_matrix[left_id, right_id] = value
+            self.class_codes = None
+        else:
+            self.class_matrix = None
+            self.class_codes, self.class_values = self._sorted_table(
+                {left_id * self.right_class_count + right_id: value for (left_id, right_id), value in self.cells.items()})
+
+        self.exception_codes, self.exception_values = self._sorted_table(
+            {left_id * self.glyph_count + right_id: value for (left_id, right_id), value in self.exceptions.items()})
+
+    def _sorted_table(self, table):
+        codes = numpy.array(sorted(table), dtype=numpy.int64)
+        values = numpy.array([table[code] for code in codes.tolist()], dtype=numpy.float64)
+        return codes, values
+
+    def _lookup_sorted(self, codes, table_codes, table_values, values):
+        '''
+        Overwrites values wherever codes are found in a sorted code table.
+        '''
+
+        if not len(table_codes):
+            return
+        positions = numpy.searchsorted(table_codes, codes)
+        positions[positions == len(table_codes)] = 0
+        found = table_codes[positions] == codes
+        values[found] = table_values[positions[found]]
+
+    def encode(self, word):
+        '''
+        Returns the list of glyph ids for a word.
+        '''
+
+        char_ids = self.char_ids
+        glyph_ids = []
+        for char in word:
+            glyph_id = char_ids.get(char)
+            if glyph_id is None:
+                glyph_id = char_ids[char] = self.glyph_ids.get(self.snapshot.gname_for(char), 0)
+            glyph_ids.append(glyph_id)
+        return glyph_ids
+
+    def pair_value(self, left_id, right_id):
+        value = self.exceptions.get((left_id, right_id))
+        if value is not None:
+            return value
+        return self.cells.get((self.left_class[left_id], self.right_class[right_id]), 0)
+
+    def widths(self, words):
+        '''
+        Returns the width of each word, kerning included.
+        '''
+
+        encoded = [self.encode(word) for word in words]
+        if numpy is None:
+            widths = []
+            for glyph_ids in encoded:
+                width = sum(self.advances[glyph_id] for glyph_id in glyph_ids)
+                for i in range(len(glyph_ids) - 1):
+                    width += self.pair_value(glyph_ids[i], glyph_ids[i + 1])
+                widths.append(width)
+            return widths
+
+        lengths = numpy.array([len(glyph_ids) for glyph_ids in encoded], dtype=numpy.int64)
+        total = int(lengths.sum())
+        if total == 0:
+            return [0] * len(encoded)
+        flat = numpy.fromiter(chain.from_iterable(encoded), dtype=numpy.int64, count=total)
+        per_glyph = self.advance_array[flat]
+
+        # Kerning between each glyph and the next
+        left, right = flat[:-1], flat[1:]
+        left_classes, right_classes = self.left_class_array[left], self.right_class_array[right]
+        if self.class_matrix is not None:
+            kerns = self.class_matrix[left_classes, right_classes]
+        else:
+            kerns = numpy.zeros(len(left), dtype=numpy.float64)
+            self._lookup_sorted(left_classes * self.right_class_count + right_classes, self.class_codes, self.class_values, kerns)
+        self._lookup_sorted(left * self.glyph_count + right, self.exception_codes, self.exception_values, kerns)
+
+        # No kerning from the last glyph of one word to the first of the next
+        ends = numpy.cumsum(lengths)
+        kerns[ends[ends < total] - 1] = 0
+        per_glyph[:-1] += kerns
+
+        widths = numpy.zeros(len(encoded), dtype=numpy.float64)
+        non_empty = lengths > 0
+        starts = (ends - lengths)[non_empty]
+        widths[non_empty] = numpy.add.reduceat(per_glyph, starts)
+        return widths.tolist()
+
+    def sort_by_width(self, words):
+        '''
+        Returns the words sorted from narrowest to widest.
+        '''
+
+        widths = self.widths(words)
+        return [word for width, i, word in sorted(zip(widths, range(len(words)), words))]
+
+    def set_width(self, gname, width):
+        '''
+        Updates one glyph’s advance in place. Returns False if the glyph is unknown.
+        '''
+
+        glyph_id = self.glyph_ids.get(gname)
+        if glyph_id is None:
+            return False
+        self.advances[glyph_id] = width
+        if numpy is not None:
+            self.advance_array[glyph_id] = width
+        return True
+
+    def set_pair(self, pair, value):
+        '''
+        Updates one class-level kerning value in place.
+        Returns False when the change can’t be applied that way and the engine should be rebuilt.
+        '''
+
+        left_id = self.left_keys.get(pair[0])
+        right_id = self.right_keys.get(pair[1])
+        if not left_id or not right_id:
+            return False
+        self.cells[left_id, right_id] = value
+        if numpy is not None:
+            if self.class_matrix is not None:
+                self.class_matrix[left_id, right_id] = value
+            else:
+                return False
+        return True
+
+
+_width_engines = weakref.WeakKeyDictionary()
+
+def get_width_engine(font, snapshot, kerning):
+    '''
+    Returns the cached WidthEngine for a font, building it if needed.
+    '''
+
+    key = get_naked(font)
+    engine = _width_engines.get(key)
+    if engine is None:
+        engine = WidthEngine(font, snapshot, kerning)
+        _width_engines[key] = engine
+    return engine
+
+
+def get_existing_width_engine(font):
+    return _width_engines.get(get_naked(font))
+
+
+def invalidate_width_engine(font):
+    _width_engines.pop(get_naked(font), None)
@@ -0,0 +1,161 @@
+from mm2sc_font import get_naked, invalidate_font_snapshot, get_existing_kerning_resolver, invalidate_kerning_resolver, get_existing_width_engine, invalidate_width_engine
+
+
+'''
+Change tracking for the font MM2SpaceCenter works with.
+
+FontState listens to the font’s defcon notifications and sorts every change into
+a category: the glyph set, unicodes, advance widths, kerning or groups. Each
+category has a version counter, so anything derived from the font can tell
+whether the data it was made from has changed (see version()).
+The font lookups of mm2sc_font are kept in step as changes come in: kerning,
+group and width changes are applied to them in place where possible, and only
+what depends on the changed data is dropped, to be rebuilt on next use.
+This module doesn’t depend on mojo.
+'''
+
+
+CATEGORIES = ('glyph_set', 'unicodes', 'widths', 'kerning', 'groups')
+
+
+def get_observed(font, attribute):
+    '''
+    Returns the object at a dotted attribute path of the font, e.g. 'layers.defaultLayer'.
+    '''
+
+    for name in attribute.split('.'):
+        font = getattr(font, name)
+    return font
+
+
+class FontState:
+    '''
+    The change tracker for one font. attach() starts listening, detach() stops
+    and drops the font’s lookups, which can’t be trusted once changes aren’t followed.
+
+    Listeners are called as listener(state, category, notification) after every change.
+    '''
+
+    # (font attribute, defcon notification, category)
+    observations = [
+        ('layers.defaultLayer', 'Layer.GlyphAdded',       'glyph_set'),
+        ('layers.defaultLayer', 'Layer.GlyphDeleted',     'glyph_set'),
+        ('layers.defaultLayer', 'Layer.GlyphNameChanged', 'glyph_set'),
+        ('unicodeData',         'UnicodeData.Changed',    'unicodes'),
+        ('dispatcher',          'Glyph.WidthChanged',     'widths'),  # Posted by every glyph, with the old and new width
+        ('kerning',             'Kerning.PairSet',        'kerning'),
+        ('kerning',             'Kerning.PairDeleted',    'kerning'),
+        ('kerning',             'Kerning.Cleared',        'kerning'),
+        ('kerning',             'Kerning.Updated',        'kerning'),
+        ('groups',              'Groups.GroupSet',        'groups'),
+        ('groups',              'Groups.GroupDeleted',    'groups'),
+        ('groups',              'Groups.Cleared',         'groups'),
+        ('groups',              'Groups.Updated',         'groups'),
+    ]
+    categories_by_notification = {notification: category for _, notification, category in observations}
+
+    def __init__(self, font):
+        self.font = font
+        self.naked = get_naked(font)
+        self.versions = dict.fromkeys(CATEGORIES, 0)
+        self.listeners = []
+        self.attached = False
+
+    def attach(self):
+        if self.attached:
+            return
+        for attribute, notification, category in self.observations:
+            get_observed(self.naked, attribute).addObserver(self, 'font_changed', notification)
+        self.attached = True
+
+    def detach(self):
+        if not self.attached:
+            return
+        for attribute, notification, category in self.observations:
+            get_observed(self.naked, attribute).removeObserver(self, notification)
+        self.attached = False
+        self.drop_lookups()
+
+    def drop_lookups(self):
+        invalidate_font_snapshot(self.font)
+        invalidate_kerning_resolver(self.font)
+        invalidate_width_engine(self.font)
+
+    def version(self, *categories):
+        '''
+        Returns the version of each category, e.g. to key a cache with.
+        '''
+
+        return tuple(self.versions[category] for category in categories)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def font_changed(self, notification):
+        category = self.categories_by_notification.get(notification.name)
+        if category is None:
+            return
+        if category == 'widths' and not self.is_default_layer_glyph(notification.object):
+            return
+        self.versions[category] += 1
+        getattr(self, 'apply_' + category)(notification)
+        for listener in list(self.listeners):
+            listener(self, category, notification)
+
+    def is_default_layer_glyph(self, glyph):
+        try:
+            return glyph.layer.name == self.naked.layers.defaultLayer.name
+        except AttributeError:
+            return False
+
+    # ----- Deltas ----- #
+
+    def apply_glyph_set(self, notification):
+        invalidate_font_snapshot(self.font)
+        invalidate_width_engine(self.font)
+
+    def apply_unicodes(self, notification):
+        invalidate_font_snapshot(self.font)
+        invalidate_width_engine(self.font)
+
+    def apply_widths(self, notification):
+        engine = get_existing_width_engine(self.font)
+        if engine is not None and not engine.set_width(notification.object.name, notification.data['newValue']):
+            invalidate_width_engine(self.font)
+
+    def apply_kerning(self, notification):
+        resolver = get_existing_kerning_resolver(self.font)
+        engine = get_existing_width_engine(self.font)
+        if notification.name == 'Kerning.PairSet':
+            key, value = notification.data['key'], notification.data['newValue']
+            if resolver is not None:
+                resolver.set_pair(key, value)
+            if engine is not None and not engine.set_pair(key, value):
+                invalidate_width_engine(self.font)
+        elif notification.name == 'Kerning.PairDeleted':
+            key = notification.data['key']
+            if resolver is not None:
+                resolver.delete_pair(key)
+            # A missing class pair kerns by 0
+            if engine is not None and not engine.set_pair(key, 0):
+                invalidate_width_engine(self.font)
+        else:
+            invalidate_kerning_resolver(self.font)
+            invalidate_width_engine(self.font)
+
+    def apply_groups(self, notification):
+        # Group membership decides the width engine’s kerning classes
+        invalidate_width_engine(self.font)
+        resolver = get_existing_kerning_resolver(self.font)
+        if resolver is None:
+            return
+        if notification.name == 'Groups.GroupSet':
+            resolver.set_group(notification.data['key'], notification.data['newValue'])
+        elif notification.name == 'Groups.GroupDeleted':
+            resolver.delete_group(notification.data['key'])
+        else:
+            resolver.rebuild_groups(self.naked.groups)
@@ -0,0 +1,243 @@
+import os
+import ezui
+from vanilla.dialogs import getFile
+
+from mm2sc_corpus import LANGUAGE_NAMES
+
+
+'''
+The MM2SC preferences popover, made with EZUI.
+
+It is only imported when the MM button is first clicked, so that ezui and vanilla
+stay off RoboFont’s startup path. The popover works on the hub it is given.
+'''
+
+
+class MM2SpaceCenterPopover(ezui.WindowController):
+    
+    
+    def build(self, parent, space_center, hub):
+
+        self.sc = space_center
+        self.hub = hub
+
+        content = '''
+        [ ] Activate MM2SC                 @activateToggle
+        
+        ---------------
+
+        Languages:
+        |------------------------------|   @languages
+        |                              |
+        |------------------------------|
+        
+        * TwoColumnForm @form
+
+        > : Spacing Context:
+        > (Auto ...)                       @context
+
+        > : Max Word Count:
+        > [_30               _]            @wordCount
+
+        > : Min Word Length:
+        > [_0                _]            @minLength
+
+        > : Max Word Length:
+        > [_0                _]            @maxLength
+
+        > : Open/Close Pairs:
+        > [_                 _]            @bracketPairs
+
+        > : Spacing Contexts:
+        > [[_                _]]           @spacingContexts
+        
+        ---------------
+
+        [ ] Make words all-caps            @allUppercase
+        [ ] Output as list sorted by width @listOutput
+        [X] Show mirrored pair (LRLR)      @mirroredPair
+        [X] Show open & close context {n}  @openCloseContext
+        [ ] Repeatable words for each pair @stableSeed
+
+        ---------------
+
+        * HorizontalStack
+        > (Custom Word List…)              @customWordListButton
+        > (Remove)                         @removeCustomWordListButton
+        No custom word list                @customWordListLabel
+        [ ] Only use custom word list      @customWordListOnly
+
+        ---------------
+
+        [ ] Show timings                   @showTimings
+        No timings yet.                    @timingsReadout
+        '''
+        
+        initial_word_count = 30
+        context_options = ['Auto'] + self.hub.get_spacing_context_names()
+
+        descriptionData = dict(
+            form=dict(
+                titleColumnWidth=106,
+                itemColumnWidth=90
+            ),
+            # wordCount=dict(
+            #         continuous=False,
+            # ),
+            languages=dict(
+                    items=LANGUAGE_NAMES,
+                    allowsMultipleSelection=True,
+                    height=120
+            ),
+            context=dict(
+                    items=context_options
+            ),
+            bracketPairs=dict(
+                    placeholder='»« ⟨⟩'
+            ),
+            spacingContexts=dict(
+                    height=60
+            ),
+            listOutput=dict(
+                    sizeStyle='small'
+            ),
+            openCloseContext=dict(
+                    sizeStyle='small'
+            ),
+            mirroredPair=dict(
+                    sizeStyle='small'
+            ),
+            allUppercase=dict(
+                    sizeStyle='small'
+            ),
+            stableSeed=dict(
+                    sizeStyle='small'
+            ),
+            customWordListLabel=dict(
+                    sizeStyle='mini'
+            ),
+            customWordListOnly=dict(
+                    sizeStyle='small'
+            ),
+            showTimings=dict(
+                    sizeStyle='small'
+            ),
+            timingsReadout=dict(
+                    sizeStyle='mini'
+            ),
+        )
+        self.w = ezui.EZPopover(
+            content=content,
+            descriptionData=descriptionData,
+            controller=self,
+            parent=parent,
+            parentAlignment='bottom',
+            behavior='transient',
+            size='auto'
+        )
+        self.wordCountField   = self.w.getItem('wordCount')
+        self.wordCountField.set(initial_word_count)
+        self.languagesField   = self.w.getItem('languages')
+        self.languagesField.setSelectedIndexes([4])
+        # May not need these:
+        self.activateToggle   = self.w.getItem('activateToggle')
+        self.contextField     = self.w.getItem('context')
+        self.listOutput       = self.w.getItem('listOutput')
+        self.openCloseContext = self.w.getItem('openCloseContext')
+        self.mirroredPair     = self.w.getItem('mirroredPair')
+        self.allUppercase     = self.w.getItem('allUppercase')
+        self.timingsReadout   = self.w.getItem('timingsReadout')
+        self.customWordListLabel = self.w.getItem('customWordListLabel')
+
+    def started(self):
+        self.w.open()
+        values = self.hub.settings.as_dict()
+        # The languages list keeps its items; the setting is which of them are selected
+        self.languagesField.setSelectedIndexes(list(values.pop('languages')))
+        values.pop('customWordList')  # Shown as a label instead
+        self.w.setItemValues(values)  # Set the previous preferences from user
+        self.update_timings_readout()
+        self.update_custom_word_list_label()
+
+    def update_custom_word_list_label(self):
+        if self.hub.settings.customWordList:
+            self.customWordListLabel.set(os.path.basename(self.hub.settings.customWordList))
+        else:
+            self.customWordListLabel.set('No custom word list')
+
+    def update_timings_readout(self):
+        if self.hub.settings.showTimings:
+            self.timingsReadout.set(self.hub.timings.format_stats())
+        else:
+            self.timingsReadout.set('')
+    
+    def flush_and_register_defaults(self):
+        values = self.w.getItemValues()
+        values['languages'] = self.languagesField.getSelectedIndexes()
+        values.pop('timingsReadout', None)
+        values.pop('customWordListLabel', None)
+        self.hub.settings.update(values)
+        self.hub.settings.save_later()  # Written to the extension defaults in the background
+        print(self.hub.settings.as_dict())  # Print a readout of the user’s updated MM2SC settings
+        
+    def activateToggleCallback(self, sender):
+        self.flush_and_register_defaults()
+        activation = sender.get()
+        # Attach or detach the shared MetricsMachine observer
+        self.hub.update_observer()
+        if activation == True:
+            print(f'MM2SpaceCenter is now set to Active.')
+        else:
+            print(f'MM2SpaceCenter is now set to Inactive.')
+        # Update the Space Center here somehow?
+        
+    def contextCallback(self,sender):
+        self.flush_and_register_defaults()
+    def listOutputCallback(self,sender):
+        self.flush_and_register_defaults()  
+    def openCloseContextCallback(self,sender):
+        self.flush_and_register_defaults()  
+    def mirroredPairCallback(self,sender):
+        self.flush_and_register_defaults()  
+    def allUppercaseCallback(self,sender):
+        self.flush_and_register_defaults()  
+    def sortedCallback(self, sender):
+        self.flush_and_register_defaults()
+    def stableSeedCallback(self,sender):
+        self.flush_and_register_defaults()
+    def customWordListButtonCallback(self, sender):
+        file_paths = getFile(title='Load custom word list', messageText='Select a text file: a word list with one word per line, or any text to take the words from', fileTypes=['txt'])
+        if not file_paths:
+            return
+        self.hub.settings.update(dict(customWordList=file_paths[0]))
+        self.hub.settings.save_later()
+        self.update_custom_word_list_label()
+        self.hub.load_custom_word_list()
+    def removeCustomWordListButtonCallback(self, sender):
+        self.hub.settings.update(dict(customWordList=''))
+        self.hub.settings.save_later()
+        self.update_custom_word_list_label()
+    def customWordListOnlyCallback(self,sender):
+        self.flush_and_register_defaults()
+    def showTimingsCallback(self,sender):
+        self.flush_and_register_defaults()
+        self.update_timings_readout()
+    def wordCountCallback(self,sender):
+        self.flush_and_register_defaults()
+    def minLengthCallback(self,sender):
+        self.flush_and_register_defaults()
+    def maxLengthCallback(self,sender):
+        self.flush_and_register_defaults()
+    def bracketPairsCallback(self,sender):
+        self.flush_and_register_defaults()
+    def spacingContextsCallback(self,sender):
+        self.flush_and_register_defaults()
+        # Keep the Spacing Context menu in step with the user’s contexts
+        names = ['Auto'] + self.hub.get_spacing_context_names()
+        self.contextField.setItems(names)
+        self.contextField.set(min(self.hub.settings.context, len(names) - 1))
+    def languagesSelectionCallback(self,sender):
+        self.flush_and_register_defaults()  
+        # Read the newly selected word lists now in the background, rather than on the next pair change
+        self.hub.load_languages()
+        # Update the Space Center here somehow?
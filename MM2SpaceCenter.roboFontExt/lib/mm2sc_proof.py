@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from mm2sc_corpus import WordListStore, TEXT_FILES, LANGUAGE_NAMES, default_cache_dir
+from mm2sc_settings import Settings
+from mm2sc_engine import PairTextEngine, pair_seed
+from mm2sc_ufo import UFOFont
+
+try:
+    from fontTools.agl import AGL2UV  # Unicodes for unencoded glyphs, like RoboFont’s GN2UV
+except ImportError:
+    AGL2UV = {}
+
+
+'''
+Kerning proofs from the command line: MM2SpaceCenter’s text for every pair in a UFO,
+made without RoboFont, sharded over a process pool and streamed out as it is made.
+
+    python3 mm2sc_proof.py MyFont.ufo > proof.txt
+    python3 mm2sc_proof.py MyFont.ufo --pairs pairs.txt --format jsonl --languages English German -o proof.jsonl
+
+Pairs come from the UFO’s kerning, or from a file with one pair per line ("A V" or "/A/V").
+Kern group names are shown as their first member. Each pair’s words are seeded by
+the pair and --seed, so the output doesn’t depend on how the pairs were sharded.
+'''
+
+
+def read_pair_list(path):
+    '''
+    Returns the pairs in a text file, one per line, as "left right" or "/left/right". Lines starting with # are skipped.
+    '''
+
+    pairs = []
+    with open(path, encoding='utf-8') as fo:
+        for line in fo:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('/'):
+                names = line[1:].split('/')
+            else:
+                names = line.split()
+            names = [name.strip() for name in names if name.strip()]
+            if len(names) == 2:
+                pairs.append(tuple(names))
+    return pairs
+
+
+def read_text(path):
+    with open(path, encoding='utf-8') as fo:
+        return fo.read()
+
+
+def get_display_pair(font, pair):
+    '''
+    Returns the glyphs to show for a kerning pair: a kern group is shown as its first member.
+    '''
+
+    def display_name(name):
+        members = font.groups.get(name)
+        return members[0] if members else name
+    return display_name(pair[0]), display_name(pair[1])
+
+
+def find_language(name):
+    '''
+    Returns the index of a language, by its name (e.g. 'English') or text file name (e.g. 'ukacd').
+    '''
+
+    lowered = name.lower()
+    for i, (language_name, text_file) in enumerate(zip(LANGUAGE_NAMES, TEXT_FILES)):
+        if lowered in (language_name.lower(), text_file):
+            return i
+    raise argparse.ArgumentTypeError(f'Unknown language: {name}. Choose from: {", ".join(LANGUAGE_NAMES)}')
+
+
+# Each worker process has its own engine
+_engine = None
+_seed = 0
+
+
+def init_worker(font, settings_values, cache_dir, seed):
+    global _engine, _seed
+    settings = Settings()
+    settings.update(settings_values)
+    _engine = PairTextEngine(font, settings, WordListStore(cache_dir=cache_dir), fallback=AGL2UV)
+    if settings.customWordList:
+        _engine.dict_words.get_custom_index(settings.customWordList)
+    # Nobody is waiting on a single pair here, and a time limit would make the output depend on the machine’s load
+    _engine.group_fallback_time_budget = float('inf')
+    _seed = seed
+
+
+def make_proof(pair):
+    '''
+    Returns the text for one pair, with the engine of this process.
+    '''
+
+    display_pair = get_display_pair(_engine.font, pair)
+    return pair, display_pair, _engine.make_text_for_pair(display_pair, seed=pair_seed(pair, _seed))
+
+
+def make_proofs(pairs):
+    return [make_proof(pair) for pair in pairs]
+
+
+def iter_chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def iter_proofs(font, pairs, settings_values, jobs=1, chunk_size=100, cache_dir=None, seed=0):
+    '''
+    Yields (pair, display pair, text) for each pair, in order, computed over jobs processes.
+    '''
+
+    # Build the compiled word indexes once, up front, so every worker only has to map them
+    store = WordListStore(cache_dir=cache_dir)
+    for language in settings_values['languages']:
+        store.get_index(TEXT_FILES[language])
+    if settings_values.get('customWordList'):
+        store.get_custom_index(settings_values['customWordList'], show_progress)
+
+    initargs = (font, settings_values, cache_dir, seed)
+    if jobs <= 1:
+        init_worker(*initargs)
+        for pair in pairs:
+            yield make_proof(pair)
+        return
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=initargs) as executor:
+        for results in executor.map(make_proofs, iter_chunks(pairs, chunk_size)):
+            yield from results
+
+
+def show_progress(done, total, stage):
+    print(f'\rIndexing custom word list ({stage})… {100 * done // total if total else 100}%', end='', file=sys.stderr)
+    if done == total:
+        print(file=sys.stderr)
+
+
+def write_proof(fo, output_format, pair, display_pair, text):
+    if output_format == 'jsonl':
+        fo.write(json.dumps(dict(pair=pair, glyphs=display_pair, text=text), ensure_ascii=False) + '\n')
+    else:
+        fo.write(text + '\n')
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Make MM2SpaceCenter kerning proof text for the pairs of a UFO.')
+    parser.add_argument('ufo', help='path to the .ufo')
+    parser.add_argument('--pairs', help='pair list file (default: every pair in the UFO’s kerning)')
+    parser.add_argument('-o', '--output', default='-', help='output file (default: standard output)')
+    parser.add_argument('--format', choices=['text', 'jsonl'], default='text', help='one text per line, or one JSON object per line')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--chunk-size', type=int, default=100, help='pairs per task sent to a worker')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the word choice')
+    parser.add_argument('--cache-dir', default=default_cache_dir(), help='where compiled word indexes are kept')
+    parser.add_argument('--languages', nargs='+', type=find_language, default=[LANGUAGE_NAMES.index('English')], help='languages to take words from')
+    parser.add_argument('--custom-word-list', default='', help='a word list or any text file to take words from, as well as the languages')
+    parser.add_argument('--custom-only', action='store_true', help='only take words from the custom word list')
+    parser.add_argument('--context', type=int, default=0, help='0: Auto, 1: UC, 2: LC, 3: Figures, 4: Fractions, 5 and up: the contexts in --spacing-contexts')
+    parser.add_argument('--spacing-contexts', default='', help='a text file of extra spacing contexts, one per line, e.g. "Small caps (.sc): /h.sc /h.sc __/o.sc /o.sc"')
+    parser.add_argument('--word-count', type=int, default=30)
+    parser.add_argument('--min-length', type=int, default=0)
+    parser.add_argument('--max-length', type=int, default=0)
+    parser.add_argument('--all-uppercase', action='store_true')
+    parser.add_argument('--list-output', action='store_true', help='list the words, sorted by width')
+    parser.add_argument('--no-mirrored-pair', action='store_true')
+    parser.add_argument('--no-open-close-context', action='store_true')
+    parser.add_argument('--bracket-pairs', default='', help='extra open/close pairs, e.g. "»« ⟨⟩"')
+    options = parser.parse_args(args)
+
+    font = UFOFont(options.ufo)
+    pairs = read_pair_list(options.pairs) if options.pairs else sorted(font.kerning)
+    settings_values = dict(
+        languages=options.languages,
+        context=options.context,
+        wordCount=options.word_count,
+        minLength=options.min_length,
+        maxLength=options.max_length,
+        allUppercase=options.all_uppercase,
+        listOutput=options.list_output,
+        mirroredPair=not options.no_mirrored_pair,
+        openCloseContext=not options.no_open_close_context,
+        bracketPairs=options.bracket_pairs,
+        spacingContexts=read_text(options.spacing_contexts) if options.spacing_contexts else '',
+        customWordList=os.path.abspath(options.custom_word_list) if options.custom_word_list else '',
+        customWordListOnly=options.custom_only,
+    )
+
+    start = time.perf_counter()
+    fo = sys.stdout if options.output == '-' else open(options.output, 'w', encoding='utf-8')
+    try:
+        proofs = iter_proofs(font, pairs, settings_values, options.jobs, options.chunk_size, options.cache_dir, options.seed)
+        for pair, display_pair, text in proofs:
+            write_proof(fo, options.format, pair, display_pair, text)
+    finally:
+        if fo is not sys.stdout:
+            fo.close()
+    print(f'{len(pairs)} pairs in {time.perf_counter() - start:.1f} s', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
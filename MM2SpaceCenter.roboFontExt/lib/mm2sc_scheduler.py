@@ -0,0 +1,287 @@
+import time
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+'''
+Background scheduling of pair changes for MM2SpaceCenter.
+
+Arrowing through pairs in MetricsMachine sends many pair changes in a row.
+The scheduler waits for them to settle, computes the text for the latest pair only,
+on a worker thread, and hands just the result back to the main thread.
+The pairs around the current one can be computed ahead of time by a Prefetcher.
+This module doesn’t depend on mojo.
+'''
+
+
+def call_now(function, *args):
+    function(*args)
+
+
+class PairScheduler:
+    '''
+    Debounces and coalesces submitted jobs, computes the latest one on a worker thread,
+    and delivers its result through call_on_main (e.g. PyObjCTools.AppHelper.callAfter).
+
+    compute(*args, is_stale=...) is given a callable it can check between stages, so work
+    for a superseded job can stop early. Stale results are never delivered.
+    '''
+
+    def __init__(self, compute, deliver, call_on_main=call_now, delay=0.03):
+        self.compute = compute
+        self.deliver = deliver
+        self.call_on_main = call_on_main
+        self.delay = delay  # Seconds a job has to stay the latest before it is computed
+        self.generation = 0
+        self._pending = None
+        self._thread = None
+        self._condition = threading.Condition()
+
+    def submit(self, *args):
+        '''
+        Schedules a job, superseding any job that hasn’t been delivered yet.
+        '''
+
+        with self._condition:
+            self.generation += 1
+            self._pending = (self.generation, args, time.monotonic())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='MM2SC pair scheduler', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+            return self.generation
+
+    def cancel(self):
+        '''
+        Drops the pending job and makes any running one stale.
+        '''
+
+        with self._condition:
+            self.generation += 1
+            self._pending = None
+
+    def stop(self):
+        with self._condition:
+            self.generation += 1
+            self._pending = None
+            self._thread = None  # The worker notices it has been replaced and returns
+            self._condition.notify_all()
+
+    def is_current(self, generation):
+        return generation == self.generation
+
+    def _next_job(self):
+        '''
+        Waits for a job that has been the latest for at least self.delay seconds. None once stopped.
+        '''
+
+        with self._condition:
+            while True:
+                if self._thread is not threading.current_thread():
+                    return None
+                if self._pending is None:
+                    self._condition.wait()
+                    continue
+                generation, args, submitted = self._pending
+                remaining = submitted + self.delay - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                self._pending = None
+                return generation, args
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            generation, args = job
+            try:
+                result = self.compute(*args, is_stale=lambda: not self.is_current(generation))
+            except Exception:
+                traceback.print_exc()
+                continue
+            if self.is_current(generation):
+                self.call_on_main(self._deliver, generation, result)
+
+    def _deliver(self, generation, result):
+        # Checked again on the main thread, in case a newer job came in meanwhile
+        if self.is_current(generation) and result is not None:
+            self.deliver(result)
+
+
+class TextCache:
+    '''
+    Bounded, thread-safe LRU cache of generated Space Center text.
+
+    Keys are expected to include everything the text depends on (pair, settings
+    fingerprint, font version), so a stale entry is simply never looked up again.
+    clear() bumps the epoch. A result computed before the clear is stored with
+    put(..., epoch=...) and is dropped, so that it can’t outlive the data it came from.
+    '''
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            text = self._items.get(key)
+            if text is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return text
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return dict(
+                size=len(self._items),
+                max_size=self.max_size,
+                hits=self.hits,
+                misses=self.misses,
+                hit_rate=self.hits / lookups if lookups else 0.0,
+                epoch=self.epoch,
+                )
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def put(self, key, text, epoch=None):
+        with self._lock:
+            if epoch is not None and epoch != self.epoch:
+                return
+            self._items[key] = text
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.epoch += 1
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+def neighbouring_items(items, index, radius):
+    '''
+    Returns the items up to radius steps before and after index, nearest first, next before previous.
+    '''
+
+    neighbours = []
+    for offset in range(1, radius + 1):
+        for i in (index + offset, index - offset):
+            if 0 <= i < len(items):
+                neighbours.append(items[i])
+    return neighbours
+
+
+class Prefetcher:
+    '''
+    Computes the text for the pairs around the current one in a bounded thread pool,
+    and stores it in a TextCache, so that moving to the next pair is instant.
+
+    compute(pair, is_stale=...) returns the text for a pair; make_key(pair) its cache key.
+    Prefetching pauses for pause_after_edit seconds after note_edit() is called.
+    '''
+
+    def __init__(self, compute, cache, make_key=lambda pair: pair, radius=3, max_workers=2, pause_after_edit=1.0):
+        self.compute = compute
+        self.cache = cache
+        self.make_key = make_key
+        self.radius = radius
+        self.max_workers = max_workers
+        self.pause_after_edit = pause_after_edit
+        self.generation = 0
+        self.last_edit = 0
+        self._last_index = None
+        self._futures = []
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def is_paused(self):
+        return time.monotonic() - self.last_edit < self.pause_after_edit
+
+    def note_edit(self):
+        '''
+        Call while the user is editing, e.g. on kerning changes. Drops queued prefetches.
+        '''
+
+        self.last_edit = time.monotonic()
+        self.cancel()
+
+    def cancel(self):
+        with self._lock:
+            self.generation += 1
+            for future in self._futures:
+                future.cancel()
+            self._futures = []
+
+    def stop(self):
+        self.cancel()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def locate(self, pairs, pair):
+        '''
+        Returns the position of pair in pairs, looking next to the last position first. None if it isn’t there.
+        '''
+
+        last = self._last_index
+        if last is not None:
+            for i in (last + 1, last, last - 1):
+                if 0 <= i < len(pairs) and pairs[i] == pair:
+                    self._last_index = i
+                    return i
+        try:
+            self._last_index = pairs.index(pair)
+        except ValueError:
+            self._last_index = None
+        return self._last_index
+
+    def prefetch(self, pairs, pair):
+        '''
+        Queues the pairs around pair in the pairs list, replacing any earlier prefetches.
+        '''
+
+        self.cancel()
+        if self.is_paused():
+            return
+        index = self.locate(pairs, pair)
+        if index is None:
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='MM2SC prefetch')
+            generation = self.generation
+            for neighbour in neighbouring_items(pairs, index, self.radius):
+                key = self.make_key(neighbour)
+                if key in self.cache:
+                    continue
+                self._futures.append(self._executor.submit(self._prefetch_one, neighbour, key, generation, self.cache.epoch))
+
+    def _prefetch_one(self, pair, key, generation, epoch):
+        def is_stale():
+            return generation != self.generation or self.is_paused()
+        if is_stale() or key in self.cache:
+            return
+        try:
+            text = self.compute(pair, is_stale=is_stale)
+        except Exception:
+            traceback.print_exc()
+            return
+        if text is not None and not is_stale():
+            self.cache.put(key, text, epoch=epoch)
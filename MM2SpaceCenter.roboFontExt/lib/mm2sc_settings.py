@@ -0,0 +1,161 @@
+import threading
+
+from mm2sc_corpus import TEXT_FILES
+
+
+'''
+MM2SpaceCenter settings, held in memory.
+
+The popover writes to one shared Settings object and the hot path reads plain
+attributes from it. Saving to the extension defaults happens shortly after the
+last change, through a call_later function (in RoboFont, one that calls on the
+main thread). This module doesn’t depend on mojo; the functions that actually
+read and write the defaults, and call_later, are handed in.
+'''
+
+
+def validate_bool(value, default):
+    return bool(value)
+
+
+def validate_str(value, default):
+    return value if isinstance(value, str) else default
+
+
+def validate_int_list(minimum=None, maximum=None):
+    def validate(value, default):
+        try:
+            values = tuple(sorted({int(item) for item in value}))
+        except (TypeError, ValueError):
+            return default
+        if not values:
+            return default
+        if minimum is not None and values[0] < minimum:
+            return default
+        if maximum is not None and values[-1] > maximum:
+            return default
+        return values
+    return validate
+
+
+def validate_int(minimum=None, maximum=None):
+    def validate(value, default):
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            return default
+        if minimum is not None and value < minimum:
+            return default
+        if maximum is not None and value > maximum:
+            return default
+        return value
+    return validate
+
+
+def call_later_on_thread(delay, function):
+    '''
+    Calls function after delay seconds, on a timer thread. For when there is no main thread run loop to call on.
+    '''
+
+    timer = threading.Timer(delay, function)
+    timer.daemon = True
+    timer.start()
+
+
+class Settings:
+    '''
+    Typed, validated MM2SC settings. The attribute names are the popover’s item identifiers.
+    '''
+
+    # name: (default, validator)
+    fields = {
+        'activateToggle':     (False, validate_bool),
+        'languages':          ((4,),  validate_int_list(0, len(TEXT_FILES) - 1)),  # Indexes into TEXT_FILES; English by default
+        'context':            (0,     validate_int(0)),  # 0: Auto, 1: UC, 2: LC, 3: Figures, 4: Fractions, 5 and up: the user’s spacing contexts
+        'wordCount':          (30,    validate_int(1)),
+        'minLength':          (0,     validate_int(0)),  # 0: no minimum word length
+        'maxLength':          (0,     validate_int(0)),  # 0: no maximum word length
+        'allUppercase':       (False, validate_bool),
+        'listOutput':         (False, validate_bool),
+        'mirroredPair':       (True,  validate_bool),
+        'openCloseContext':   (True,  validate_bool),
+        'showTimings':        (False, validate_bool),  # Show the per-stage timings in the popover
+        'customWordList':     ('',    validate_str),  # Path of a custom word list or corpus; '' for none
+        'customWordListOnly': (False, validate_bool),  # Take words from the custom word list only, not the languages
+        'stableSeed':         (False, validate_bool),  # Same words for a pair every time, instead of new ones each time
+        'bracketPairs':       ('',    validate_str),  # Extra open/close pairs for the open/close context, e.g. '»« ⟨⟩'
+        'spacingContexts':    ('',    validate_str),  # The user’s spacing contexts, one per line, e.g. 'Small caps (.sc): /h.sc /h.sc __/o.sc /o.sc'
+    }
+
+    save_delay = 0.5  # Seconds to wait for more changes before saving
+
+    def __init__(self, load=None, save=None, call_later=call_later_on_thread):
+        self._save = save
+        self._call_later = call_later
+        self._save_generation = 0  # Goes up with every save_later() and save_now(), so only the latest scheduled save happens
+        self._lock = threading.Lock()
+        self.version = 0  # Goes up whenever a setting changes
+        for name, (default, validate) in self.fields.items():
+            setattr(self, name, default)
+        if load is not None:
+            self.update(load() or {})
+
+    def update(self, values):
+        '''
+        Sets every known setting in values, after validating it. Unknown keys are ignored.
+        '''
+
+        if 'language' in values and 'languages' not in values:
+            # Settings saved before several languages could be chosen
+            values = dict(values, languages=[values['language']])
+
+        for name, value in values.items():
+            field = self.fields.get(name)
+            if field is None:
+                continue
+            default, validate = field
+            old_value = getattr(self, name, default)
+            new_value = validate(value, old_value)
+            if new_value != old_value:
+                setattr(self, name, new_value)
+                self.version += 1
+
+    def get(self, name):
+        '''
+        Returns a setting by name, or 0 for an unknown name.
+        '''
+
+        return getattr(self, name, 0) if name in self.fields else 0
+
+    def fingerprint(self):
+        '''
+        Returns a hashable summary of every setting, e.g. for cache keys.
+        '''
+
+        return tuple(getattr(self, name) for name in self.fields)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.fields}
+
+    def save_later(self):
+        '''
+        Saves the settings through call_later, once they have stopped changing for save_delay seconds.
+        '''
+
+        if self._save is None:
+            return
+        with self._lock:
+            self._save_generation += 1
+            generation = self._save_generation
+        self._call_later(self.save_delay, lambda: self._save_if_latest(generation))
+
+    def _save_if_latest(self, generation):
+        # A later save_later() or save_now() has taken over
+        if generation == self._save_generation:
+            self.save_now()
+
+    def save_now(self):
+        with self._lock:
+            self._save_generation += 1
+        if self._save is not None:
+            self._save(self.as_dict())
@@ -0,0 +1,138 @@
+import json
+import math
+import time
+import threading
+from collections import deque
+
+
+'''
+Per-stage timings for MM2SpaceCenter.
+
+Each text generation is one run. A run takes a lap at the end of every stage
+(search, width sorting, open/close context, setRaw…), which costs one perf_counter
+call, and the finished run goes into a ring buffer of recent runs. Stats per stage
+are only worked out when asked for. This module doesn’t depend on mojo.
+'''
+
+
+def percentile(sorted_values, fraction):
+    '''
+    Returns the nearest-rank percentile of an already sorted list, e.g. fraction=0.95 for p95.
+    '''
+
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values), math.ceil(fraction * len(sorted_values))) - 1)
+    return sorted_values[rank]
+
+
+class TimingRun:
+    '''
+    The timings of one run, in seconds by stage. Time between laps counts towards the stage named by the lap.
+    '''
+
+    def __init__(self, recorder, label=None):
+        self.recorder = recorder
+        self.label = label
+        self.stages = {}
+        self.started = self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def finish(self):
+        self.stages['total'] = time.perf_counter() - self.started
+        self.recorder.add(self.stages, self.label)
+
+
+class TimingRecorder:
+    '''
+    Ring buffer of the last max_runs runs.
+    '''
+
+    def __init__(self, max_runs=500):
+        self.runs = deque(maxlen=max_runs)  # (wall clock time, label, {stage: seconds})
+        self._lock = threading.Lock()
+
+    def start(self, label=None):
+        return TimingRun(self, label)
+
+    def add(self, stages, label=None):
+        with self._lock:
+            self.runs.append((time.time(), label, dict(stages)))
+
+    def record(self, stage, seconds, label=None):
+        '''
+        Adds a stage timed outside of a run (e.g. setRaw on the main thread) to the latest run,
+        if that run has the same label and doesn’t have the stage yet. Otherwise it is a run of its own.
+        '''
+
+        with self._lock:
+            if self.runs:
+                _, last_label, stages = self.runs[-1]
+                if last_label == label and stage not in stages:
+                    stages[stage] = seconds
+                    if 'total' in stages:
+                        stages['total'] += seconds
+                    return
+            self.runs.append((time.time(), label, {stage: seconds}))
+
+    def clear(self):
+        with self._lock:
+            self.runs.clear()
+
+    def samples(self):
+        '''
+        Returns every stage’s recent timings in seconds, oldest first.
+        '''
+
+        with self._lock:
+            runs = list(self.runs)
+        samples = {}
+        for _, _, stages in runs:
+            for stage, seconds in stages.items():
+                samples.setdefault(stage, []).append(seconds)
+        return samples
+
+    def stats(self):
+        '''
+        Returns {stage: dict(count, p50, p95, max)}, in milliseconds.
+        '''
+
+        stats = {}
+        for stage, values in self.samples().items():
+            values = sorted(values)
+            stats[stage] = dict(
+                count=len(values),
+                p50=percentile(values, 0.5) * 1000,
+                p95=percentile(values, 0.95) * 1000,
+                max=values[-1] * 1000,
+                )
+        return stats
+
+    def format_stats(self):
+        '''
+        Returns the stats as lines of text, slowest stage first.
+        '''
+
+        stats = self.stats()
+        if not stats:
+            return 'No timings yet.'
+        lines = []
+        for stage, stage_stats in sorted(stats.items(), key=lambda item: -item[1]['p95']):
+            lines.append(f"{stage}: p50 {stage_stats['p50']:.1f}  p95 {stage_stats['p95']:.1f}  max {stage_stats['max']:.1f} ms  (n={stage_stats['count']})")
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        '''
+        Writes the runs to a JSON Lines file, one run per line, with timings in milliseconds.
+        '''
+
+        with self._lock:
+            runs = list(self.runs)
+        with open(path, 'w', encoding='utf-8') as fo:
+            for wall_time, label, stages in runs:
+                run = dict(time=wall_time, label=label, stages={stage: seconds * 1000 for stage, seconds in stages.items()})
+                fo.write(json.dumps(run, ensure_ascii=False) + '\n')
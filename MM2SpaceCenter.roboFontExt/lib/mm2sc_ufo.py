@@ -0,0 +1,81 @@
+import os
+import plistlib
+import xml.etree.ElementTree as ET
+
+
+'''
+A lightweight, read-only UFO reader for MM2SpaceCenter outside RoboFont.
+
+Only reads what the pair-to-text engine needs: glyph names, unicodes and
+advance widths from the default layer, plus groups and kerning. Nothing is
+kept of outlines, anchors or lib data. This module doesn’t depend on mojo.
+'''
+
+
+class UFOGlyph:
+    def __init__(self, name, unicodes, width):
+        self.name = name
+        self.unicodes = unicodes
+        self.unicode = unicodes[0] if unicodes else None
+        self.width = width
+
+
+def read_plist(path, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'rb') as fo:
+        return plistlib.load(fo)
+
+
+def read_glif(path):
+    '''
+    Returns the unicodes and advance width in a .glif file.
+    '''
+
+    unicodes = []
+    width = 0
+    with open(path, 'rb') as fo:
+        for event, element in ET.iterparse(fo, events=('start',)):
+            if element.tag == 'unicode':
+                unicodes.append(int(element.get('hex'), 16))
+            elif element.tag == 'advance':
+                width = float(element.get('width', 0))
+    return unicodes, width
+
+
+class UFOFont:
+    '''
+    The glyphs, groups and kerning of a UFO (version 2 or 3).
+
+    Iterating gives UFOGlyph objects; kerning is a {(left, right): value} dict.
+    '''
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        glyphs_dir = os.path.join(self.path, 'glyphs')  # The default layer, in UFO 2 and 3
+        contents = read_plist(os.path.join(glyphs_dir, 'contents.plist'), {})
+        self._glyphs = {}
+        for name, file_name in contents.items():
+            unicodes, width = read_glif(os.path.join(glyphs_dir, file_name))
+            self._glyphs[name] = UFOGlyph(name, unicodes, width)
+
+        self.groups = {name: tuple(members) for name, members in read_plist(os.path.join(self.path, 'groups.plist'), {}).items()}
+        self.kerning = {}
+        for left, rights in read_plist(os.path.join(self.path, 'kerning.plist'), {}).items():
+            for right, value in rights.items():
+                self.kerning[(left, right)] = value
+
+    def keys(self):
+        return self._glyphs.keys()
+
+    def __iter__(self):
+        return iter(self._glyphs.values())
+
+    def __len__(self):
+        return len(self._glyphs)
+
+    def __getitem__(self, name):
+        return self._glyphs[name]
+
+    def __contains__(self, name):
+        return name in self._glyphs
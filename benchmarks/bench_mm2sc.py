@@ -0,0 +1,379 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import statistics
+
+from standins import install_stand_in_modules, StandInFont, make_tool
+
+
+'''
+Headless benchmarks for MM2SpaceCenter’s word generation.
+
+Runs the real hub against a stand-in font and Space Center on plain CPython, and measures
+the latency and peak Python memory of load_dictionaries, words_for_pair, sort_words_by_width,
+make_open_close_context and make_spacing_string, for every bundled language and every kind of pair.
+Startup is timed too: importing MM2SpaceCenter in a fresh interpreter, as RoboFont does
+at launch, with the list of RoboFont-side modules that got imported along the way.
+It also reports how much Python memory each word list holds on to: as a plain list of str
+(how every list used to be kept), as a compact CompiledWordList, and as a bigram index.
+
+    python3 benchmarks/bench_mm2sc.py                          # Run, and write benchmarks/latest.json
+    python3 benchmarks/bench_mm2sc.py --save-baseline          # Run, and make it the baseline
+    python3 benchmarks/bench_mm2sc.py --compare                # Run, and compare against the baseline
+
+Comparing exits with status 1 if any median got slower than the tolerance allows.
+'''
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'latest.json')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+# name: pair
+PAIR_KINDS = {
+    'uppercase':   ('A', 'V'),
+    'lowercase':   ('o', 'v'),
+    'mixed_case':  ('T', 'o'),
+    'figure':      ('one', 'seven'),
+    'suffixed':    ('a.sc', 'v.sc'),
+    'group_fallback': ('f_f', 'i'),  # f_f has no character, so the words come from another pair in its kern group
+}
+
+SETTINGS = dict(
+    activateToggle=True,
+    context=0,
+    wordCount=30,
+    minLength=0,
+    maxLength=0,
+    allUppercase=False,
+    listOutput=False,
+    mirroredPair=True,
+    openCloseContext=True,
+)
+
+
+def measure(function, repeat):
+    '''
+    Returns the timings of repeat calls in milliseconds, and the peak Python memory of one more call in KiB.
+    '''
+
+    timings = []
+    for i in range(repeat):
+        random.seed(i)
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    random.seed(repeat)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        function()
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+    return dict(
+        min_ms=round(min(timings), 4),
+        median_ms=round(statistics.median(timings), 4),
+        max_ms=round(max(timings), 4),
+        peak_kib=round(peak / 1024, 1),
+        runs=repeat,
+    )
+
+
+def measure_retained(make):
+    '''
+    Returns how much Python memory, in KiB, is still held by what make() returns.
+    '''
+
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        kept = make()
+        retained = tracemalloc.get_traced_memory()[0] - base
+    finally:
+        tracemalloc.stop()
+    del kept
+    return round(retained / 1024, 1)
+
+
+# Run in a fresh interpreter, so nothing is imported or cached yet
+STARTUP_SCRIPT = '''
+import sys, json, time
+sys.path.insert(0, {bench_dir!r})
+from standins import install_stand_in_modules, imported_stand_ins
+install_stand_in_modules()
+start = time.perf_counter()
+import MM2SpaceCenter
+elapsed = time.perf_counter() - start
+print(json.dumps(dict(ms=elapsed * 1000, imported=sorted(imported_stand_ins), numpy='numpy' in sys.modules)))
+'''
+
+
+def measure_startup(repeat):
+    '''
+    Returns the timings of importing MM2SpaceCenter in repeat fresh interpreters, and what the import pulled in.
+    '''
+
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT.format(bench_dir=BENCH_DIR)], capture_output=True, text=True, check=True).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        timings.append(run['ms'])
+    return dict(
+        min_ms=round(min(timings), 4),
+        median_ms=round(statistics.median(timings), 4),
+        max_ms=round(max(timings), 4),
+        runs=repeat,
+        imported=run['imported'],
+        numpy=run['numpy'],
+    )
+
+
+class Benchmark:
+    '''
+    One hub, one stand-in font and one stand-in Space Center, and the measurements taken with them.
+    '''
+
+    def __init__(self, repeat=20, load_repeat=3, languages=None):
+        install_stand_in_modules()
+        import MM2SpaceCenter
+        import mm2sc_corpus
+        self.module = MM2SpaceCenter
+        self.corpus_module = mm2sc_corpus
+        self.repeat = repeat
+        self.load_repeat = load_repeat
+        self.language_names = languages or list(mm2sc_corpus.LANGUAGE_NAMES)
+        self.results = {}
+        self.memory = {}  # 'language/storage': KiB
+
+        self.hub = MM2SpaceCenter.hub
+        self.tool = make_tool(MM2SpaceCenter.MM2SC_Tool)
+        self.hub.tools = [self.tool]
+        self.font = StandInFont()
+        self.hub.set_font(self.font)
+        MM2SpaceCenter.settings.update(SETTINGS)
+
+    def add(self, stage, language, kind, result):
+        self.results[f'{stage}/{language}/{kind}'] = result
+
+    def language_index(self, language):
+        return self.corpus_module.LANGUAGE_NAMES.index(language)
+
+    def use_language(self, language):
+        self.module.settings.update(dict(languages=[self.language_index(language)]))
+
+    def bench_load_dictionaries(self, language):
+        '''
+        Times load_dictionaries plus the first use of a language: cold (building
+        and compiling the index) and warm (opening the compiled index).
+        '''
+
+        name = self.corpus_module.TEXT_FILES[self.language_index(language)]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            def load(cold):
+                if cold:
+                    for file_name in os.listdir(cache_dir):
+                        os.remove(os.path.join(cache_dir, file_name))
+                self.module.word_lists = self.corpus_module.WordListStore(cache_dir=cache_dir)
+                self.hub.load_dictionaries()
+                self.hub.dict_words.get_index(name)
+
+            self.add('load_dictionaries', language, 'cold', measure(lambda: load(True), self.load_repeat))
+            self.add('load_dictionaries', language, 'warm', measure(lambda: load(False), self.repeat))
+
+            # Keep the warm store for the rest of this language’s benchmarks
+            load(False)
+
+    def bench_word_list_memory(self, language):
+        '''
+        Measures the memory a word list holds on to, kept in each of the ways it can be kept.
+        '''
+
+        corpus = self.corpus_module
+        path = self.hub.dict_words.path_for(corpus.TEXT_FILES[self.language_index(language)])
+        self.memory[f'{language}/list'] = measure_retained(lambda: corpus.read_word_list(path))
+        self.memory[f'{language}/compact'] = measure_retained(lambda: corpus.CompiledWordList.from_words(corpus.read_word_list(path)))
+        self.memory[f'{language}/index'] = measure_retained(lambda: corpus.BigramIndex(corpus.read_word_list(path)))
+        with tempfile.TemporaryDirectory() as cache_dir:
+            corpus.load_index(path, cache_dir)
+            # Only the bigram table is on the Python heap; the rest is mapped from the file
+            self.memory[f'{language}/mapped_index'] = measure_retained(lambda: corpus.load_index(path, cache_dir))
+
+    def forget_contexts(self, cold):
+        '''
+        Makes the open/close and spacing contexts of the next call be worked out again, rather than looked up
+        from the previous run: cold drops the per-font tables, otherwise only the contexts they remember per pair.
+        '''
+
+        if cold:
+            self.hub._open_close_table = None
+            self.hub._spacing_context_table = None
+        else:
+            self.hub.get_open_close_table().contexts.clear()
+            self.hub.get_spacing_context_table().strings.clear()
+
+    def bench_words_for_pair(self, language):
+        for kind, pair in PAIR_KINDS.items():
+            def words_for_pair():
+                # As for a pair not shown before
+                self.forget_contexts(cold=False)
+                self.hub.pair = pair
+                self.hub.words_for_pair()
+            self.add('words_for_pair', language, kind, measure(words_for_pair, self.repeat))
+
+    def bench_sort_words_by_width(self, language):
+        corpus = self.hub.dict_words.get_corpus(self.module.settings.languages)
+        for kind, pair in PAIR_KINDS.items():
+            _, search_string, _, mixed_case = self.hub.get_search_info(pair)
+            random.seed(0)
+            word_list = self.hub.collect_words(corpus, search_string, mixed_case, self.module.settings.wordCount)
+            if not word_list:
+                continue
+            self.add('sort_words_by_width', language, kind, measure(lambda: self.hub.sort_words_by_width(word_list), self.repeat))
+
+    def bench_startup(self):
+        self.add('startup', '-', 'import', measure_startup(self.load_repeat * 2))
+
+    def bench_contexts(self):
+        '''
+        Times make_open_close_context and make_spacing_string, which don’t depend on the language:
+        cold (building the font’s table first) and warm (a new pair, with the table already built).
+        '''
+
+        for stage in ['make_open_close_context', 'make_spacing_string']:
+            make = getattr(self.hub, stage)
+            for kind, pair in PAIR_KINDS.items():
+                for temperature in ['cold', 'warm']:
+                    def run():
+                        self.forget_contexts(cold=temperature == 'cold')
+                        make(pair)
+                    self.add(stage, '-', f'{kind}-{temperature}', measure(run, self.repeat))
+
+    def run(self, log=print):
+        started = time.perf_counter()
+        self.bench_startup()
+        self.bench_contexts()
+        for language in self.language_names:
+            log(f'{language}…')
+            self.use_language(language)
+            self.bench_load_dictionaries(language)
+            self.bench_word_list_memory(language)
+            self.bench_words_for_pair(language)
+            self.bench_sort_words_by_width(language)
+        return dict(
+            meta=dict(
+                python=platform.python_version(),
+                implementation=platform.python_implementation(),
+                platform=platform.platform(),
+                numpy=self.has_numpy(),
+                repeat=self.repeat,
+                settings=SETTINGS,
+                pairs=PAIR_KINDS,
+                seconds=round(time.perf_counter() - started, 2),
+            ),
+            results=self.results,
+            memory=self.memory,
+        )
+
+    def has_numpy(self):
+        import mm2sc_font
+        return mm2sc_font.import_numpy() is not None
+
+
+def compare(results, baseline, tolerance, min_difference=0.05):
+    '''
+    Returns (key, baseline median, median, ratio) for every result slower than tolerance allows.
+    Differences under min_difference milliseconds are timer noise, and are ignored.
+    '''
+
+    regressions = []
+    for key, result in results['results'].items():
+        before = baseline['results'].get(key)
+        if before is None or not before['median_ms']:
+            continue
+        ratio = result['median_ms'] / before['median_ms']
+        if ratio > 1 + tolerance and result['median_ms'] - before['median_ms'] >= min_difference:
+            regressions.append((key, before['median_ms'], result['median_ms'], ratio))
+    return regressions
+
+
+def summarize(results):
+    '''
+    Returns the median latency of each stage and pair kind, over all languages.
+    '''
+
+    by_stage = {}
+    for key, result in results['results'].items():
+        stage, language, kind = key.split('/')
+        by_stage.setdefault((stage, kind), []).append(result['median_ms'])
+    lines = []
+    for (stage, kind), medians in sorted(by_stage.items()):
+        lines.append(f'{stage:<26} {kind:<20} median {statistics.median(medians):9.3f} ms   max {max(medians):9.3f} ms')
+    return '\n'.join(lines)
+
+
+def summarize_memory(results):
+    '''
+    Returns the memory held by all the word lists together, for each way of keeping them.
+    '''
+
+    totals = {}
+    for key, kib in results.get('memory', {}).items():
+        language, storage = key.split('/')
+        totals[storage] = totals.get(storage, 0) + kib
+    if not totals:
+        return ''
+    lines = []
+    for storage, kib in totals.items():
+        lines.append(f'{"word list memory":<26} {storage:<12} {kib / 1024:9.1f} MiB')
+    return '\n'.join(lines)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark MM2SpaceCenter’s word generation without RoboFont.')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per measurement')
+    parser.add_argument('--languages', nargs='*', help='language names to run (default: all)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='where to write the results')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file to save or compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='also write the results to the baseline file')
+    parser.add_argument('--compare', action='store_true', help='compare the results against the baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown when comparing, e.g. 0.25 for 25%%')
+    parser.add_argument('--min-difference', type=float, default=0.05, help='slowdowns under this many milliseconds are ignored')
+    options = parser.parse_args(args)
+
+    results = Benchmark(repeat=options.repeat, languages=options.languages).run()
+    print(summarize(results))
+    print(summarize_memory(results))
+    startup = results['results']['startup/-/import']
+    print(f'{"startup":<26} imported {", ".join(startup["imported"]) or "nothing"} from RoboFont{", and numpy" if startup["numpy"] else ""}')
+
+    paths = [options.output] + ([options.baseline] if options.save_baseline else [])
+    for path in paths:
+        with open(path, 'w', encoding='utf-8') as fo:
+            json.dump(results, fo, indent=1, ensure_ascii=False)
+        print('Saved', path)
+
+    if options.compare:
+        with open(options.baseline, encoding='utf-8') as fo:
+            baseline = json.load(fo)
+        regressions = compare(results, baseline, options.tolerance, options.min_difference)
+        for key, before, after, ratio in regressions:
+            print(f'Slower: {key}  {before:.3f} → {after:.3f} ms  (×{ratio:.2f})')
+        if regressions:
+            return 1
+        print('No regressions against', options.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
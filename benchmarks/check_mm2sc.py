@@ -0,0 +1,437 @@
+import os
+import sys
+import random
+import shutil
+import tempfile
+import argparse
+import itertools
+
+from standins import install_stand_in_modules, StandInFont, StandInGlyph, GN2UV
+
+
+'''
+Headless regression checks for MM2SpaceCenter’s rewritten hot paths.
+
+Each check runs the current code on the stand-in font and compares it, case by case,
+with a plain reference: the code it replaced, kept here as it was. They are meant to
+be run alongside the benchmarks, so that a speedup is never a change in the output.
+
+    python3 benchmarks/check_mm2sc.py                      # Run every check
+    python3 benchmarks/check_mm2sc.py open_close index     # Run some of them
+
+Exits with status 1 if anything differs from its reference.
+'''
+
+
+MAX_SHOWN = 10  # Mismatches listed per check
+
+
+# ========== Open/close contexts ========== #
+
+# Bracket glyphs with a suffix, so that partners are looked up with their suffix.
+# braceleft.sc has no braceright.sc, so its partner is the plain braceright.
+SUFFIXED_BRACKETS = ['parenleft.sc', 'parenright.sc', 'bracketleft.sc', 'bracketright.sc', 'quoteleft.sc', 'quoteright.sc', 'braceleft.sc']
+
+OPEN_CLOSE_NAMES = [
+    'A', 'o', 'a.sc', 'slash', 'backslash', 'less', 'greater', 'quotesingle', 'quotedbl', 'exclamdown', 'exclam', 'questiondown',
+    'parenleft', 'parenright', 'bracketleft', 'bracketright', 'braceleft', 'braceright',
+    'quoteleft', 'quoteright', 'quotedblleft', 'quotedblright', 'guillemotleft', 'guillemotright', 'guilsinglleft', 'guilsinglright',
+] + SUFFIXED_BRACKETS
+
+
+def reference_open_close_context(engine, pair, open_close_pairs):
+    '''
+    make_open_close_context as it was before the OpenCloseTable: a walk over every open/close pair, in order.
+    open_close_pairs is a list of (open, close), the user’s pairs first.
+    '''
+
+    def get_key(val):
+        for key, value in open_close_pairs:
+            if val == value:
+                return key
+
+    def partner(char, suffix):
+        gname = engine.get_gname_from_char(char)
+        # The one change the table made on purpose: the plain glyph if the font doesn’t have the suffixed one
+        if suffix and gname + suffix not in engine.font:
+            return engine.get_sc_string_from_gname(gname)
+        return engine.get_sc_string_from_gname(gname + suffix)
+
+    unis_in_font = engine.get_font_snapshot().unicodes
+    left_search, right_search = engine.get_char_from_gname(pair[0], no_suff=True), engine.get_char_from_gname(pair[1], no_suff=True)
+    l_sc, r_sc = engine.get_sc_string_from_gname(pair[0]), engine.get_sc_string_from_gname(pair[1])
+
+    open_close_chars = {char for open_close_pair in open_close_pairs for char in open_close_pair}
+    if left_search not in open_close_chars and right_search not in open_close_chars:
+        return ''
+
+    l_suff = '.' + '.'.join(pair[0].split('.')[1:]) if '.' in l_sc else ''
+    r_suff = '.' + '.'.join(pair[1].split('.')[1:]) if '.' in r_sc else ''
+    open_close_string = ''
+    for open_close_pair in open_close_pairs:
+        if open_close_pair == (left_search, right_search):
+            open_close_string = l_sc + r_sc
+            break
+        elif open_close_pair == (right_search, left_search):
+            open_close_string = r_sc + l_sc
+            break
+        elif open_close_pair[0] == left_search and ord(open_close_pair[1]) in unis_in_font:
+            open_close_string = l_sc + r_sc + partner(open_close_pair[1], l_suff)
+            break
+        elif open_close_pair[1] == right_search and ord(open_close_pair[0]) in unis_in_font:
+            open_close_string = partner(get_key(right_search), r_suff) + l_sc + r_sc
+            break
+        elif open_close_pair[0] == right_search and ord(open_close_pair[1]) in unis_in_font:
+            open_close_string = partner(open_close_pair[1], r_suff) + l_sc + r_sc
+            break
+        elif open_close_pair[1] == left_search and ord(open_close_pair[0]) in unis_in_font:
+            open_close_string = l_sc + r_sc + partner(get_key(left_search), l_suff)
+            break
+    return open_close_string + ' '
+
+
+def check_open_close():
+    '''
+    make_open_close_context against the reference, for every pair of bracket-ish glyphs, with and without the user’s pairs.
+    '''
+
+    from mm2sc_engine import PairTextEngine, parse_bracket_pairs
+    from mm2sc_settings import Settings
+
+    font = StandInFont()
+    for gname in SUFFIXED_BRACKETS:
+        font._glyphs[gname] = StandInGlyph(gname, [], 300)
+    engine = PairTextEngine(font, Settings(), fallback=GN2UV)
+
+    cases = 0
+    mismatches = []
+    for bracket_pairs in ('', '»« ⟨⟩ ()'):
+        engine.settings.update(dict(bracketPairs=bracket_pairs))
+        open_close_pairs = list(parse_bracket_pairs(bracket_pairs)) + list(engine.open_close_pairs.items())
+        for pair in itertools.product(OPEN_CLOSE_NAMES, repeat=2):
+            expected = reference_open_close_context(engine, pair, open_close_pairs)
+            # Twice: worked out, then from the table’s memo
+            for got in (engine.make_open_close_context(pair), engine.make_open_close_context(pair)):
+                cases += 1
+                if got != expected:
+                    mismatches.append(f'{pair} with {bracket_pairs!r}: {got!r}, expected {expected!r}')
+    return cases, mismatches
+
+
+# ========== Spacing strings ========== #
+
+# The user’s contexts, with nothing in the stand-in font for Auto to pick them for
+USER_SPACING_CONTEXTS = 'Cyrillic (А-яЁё): нн__но__он__оо__нн\nGreek (Α-ω): ΗΗ__ΗΟ__ΟΗ__ΟΟ__ΗΗ'
+
+
+def reference_spacing_string(engine, pair, context):
+    '''
+    make_spacing_string as it was before the SpacingContextTable, for the built-in contexts: 0 (Auto) to 4.
+    '''
+
+    context_strings = {
+        1: 'HH__HO__OH__OO__HH',
+        2: 'nn__no__on__oo__nn',
+        3: '11__10__01__00__11',
+        4: '11__/10/__01__/00/__11',
+        4.1: '11/eight.numr __10/one.numr __00',
+        4.2: '11__/eight.dnom 10__/eight.dnom 00',
+    }
+    pair_string = ''.join(engine.get_pair_in_sc_strings(pair))
+    pair_search_string = engine.get_char_from_gname(pair[0], no_suff=True) + engine.get_char_from_gname(pair[1], no_suff=True)
+
+    if context == 4:
+        string = context_strings[4].replace('__', pair_string)
+        if pair_string.startswith('⁄'):
+            string = context_strings[4.1].replace('__', pair_string)
+        elif pair_string.endswith('⁄'):
+            string = context_strings[4.2].replace('__', pair_string)
+    elif context:
+        string = context_strings[context].replace('__', pair_string)
+    elif set(pair_search_string) & set('0123456789'):
+        string = context_strings[3].replace('__', pair_string)
+    elif pair_search_string == pair_search_string.upper():
+        string = context_strings[1].replace('__', pair_string)
+    else:
+        string = context_strings[2].replace('__', pair_string)
+    return string + '\\n'
+
+
+def check_spacing():
+    '''
+    make_spacing_string against the reference, for pairs of the font’s glyphs (and a few it doesn’t have),
+    in every built-in context, with and without the user’s contexts.
+    '''
+
+    from mm2sc_engine import PairTextEngine
+    from mm2sc_settings import Settings
+
+    font = StandInFont()
+    engine = PairTextEngine(font, Settings(), fallback=GN2UV)
+    names = sorted(font.keys()) + ['public.kern1.O', 'missing', 'fraction.alt']
+    # A fifth of the pairs, always the same ones: every kind of glyph still meets every other, in a few seconds
+    all_pairs = list(itertools.product(names, repeat=2))
+    pairs = random.Random(1).sample(all_pairs, len(all_pairs) // 5)
+
+    cases = 0
+    mismatches = []
+    for spacing_contexts in ('', USER_SPACING_CONTEXTS):
+        for context in range(5):
+            engine.settings.update(dict(spacingContexts=spacing_contexts, context=context))
+            for pair in pairs:
+                cases += 1
+                got = engine.make_spacing_string(pair)
+                expected = reference_spacing_string(engine, pair, context)
+                if got != expected:
+                    mismatches.append(f'{pair} in context {context}{" with the user’s contexts" if spacing_contexts else ""}: {got!r}, expected {expected!r}')
+    return cases, mismatches
+
+
+# ========== Word indexes ========== #
+
+INDEX_WORD_LIST = 'german'  # Short enough to scan, and not only ASCII
+LENGTH_LIMITS = [(0, 0), (3, 0), (0, 5), (4, 7), (9, 3)]  # (min_length, max_length), 0 for no limit
+
+
+def reference_find(words, search_string):
+    '''
+    The words that contain search_string, found the way they were before the bigram index: by looking at every word.
+    '''
+
+    if len(search_string) < 2:
+        return []
+    return sorted(word for word in words if search_string in word)
+
+
+def compare_index(label, index, words, matches):
+    '''
+    Returns the number of lookups made in index, and how they differ from matches, the reference_find() result for each search string.
+    '''
+
+    cases = 1
+    mismatches = []
+    if sorted(index.words) != sorted(words):
+        mismatches.append(f'{label}: {len(index.words)} words, expected {len(words)}')
+    lengths = [len(word) for word in index.words]
+    if lengths != sorted(lengths):
+        mismatches.append(f'{label}: the words aren’t sorted by length')
+    for search_string, matching_words in matches.items():
+        for min_length, max_length in LENGTH_LIMITS:
+            cases += 1
+            got = sorted(index.words[word_id] for word_id in index.find(search_string, min_length, max_length))
+            expected = [word for word in matching_words if len(word) >= min_length and (not max_length or len(word) <= max_length)]
+            if got != expected:
+                mismatches.append(f'{label}: {search_string!r} with lengths {min_length}–{max_length}: {len(got)} words, expected {len(expected)}')
+    return cases, mismatches
+
+
+def check_index():
+    '''
+    Word lookups in every form a word index takes, against a scan of the words: built in memory, compiled
+    and memory-mapped, reopened from the compiled file, reopened after the source file was touched,
+    and, for a custom corpus, streamed through sorted runs on disk.
+    '''
+
+    import mm2sc_corpus
+    from mm2sc_corpus import BigramIndex, WordListStore, load_index, load_custom_index, read_index_header
+    from mm2sc_corpus import read_word_list, iter_tokens, iter_unique_sorted, compile_sorted_words, open_compiled_index
+
+    rng = random.Random(1)
+    cases = 0
+    mismatches = []
+    temp_dir = tempfile.mkdtemp(prefix='mm2sc-check-')
+    try:
+        source_path = os.path.join(temp_dir, INDEX_WORD_LIST + '.txt')
+        shutil.copyfile(WordListStore().path_for(INDEX_WORD_LIST), source_path)
+        words = read_word_list(source_path)
+
+        # Every bigram of a sample of the words, longer strings, and strings no word has
+        search_strings = set()
+        for word in rng.sample(words, 60):
+            search_strings.update(word[i:i + 2] for i in range(len(word) - 1))
+            search_strings.add(word[:3])
+            search_strings.add(word[-4:])
+        search_strings.update(['qx', 'zzz', 'ß', '', 'ä'])
+        matches = {search_string: reference_find(words, search_string) for search_string in sorted(search_strings)}
+
+        cache_dir = os.path.join(temp_dir, 'cache')
+        indexes = [
+            ('in memory', lambda: BigramIndex(words)),
+            ('compiled', lambda: load_index(source_path, cache_dir)),
+            ('reopened', lambda: load_index(source_path, cache_dir)),
+        ]
+        for label, make_index in indexes:
+            index_cases, index_mismatches = compare_index(label, make_index(), words, matches)
+            cases += index_cases
+            mismatches += index_mismatches
+
+        # Same words, new mtime: the index is kept, and the new mtime recorded
+        source_mtime = os.stat(source_path).st_mtime + 10
+        os.utime(source_path, (source_mtime, source_mtime))
+        index_cases, index_mismatches = compare_index('touched', load_index(source_path, cache_dir), words, matches)
+        cases += index_cases + 1
+        mismatches += index_mismatches
+        header = read_index_header(os.path.join(cache_dir, INDEX_WORD_LIST + mm2sc_corpus.INDEX_EXTENSION))
+        if header['source_mtime'] != source_mtime:
+            mismatches.append(f'touched: the index records mtime {header["source_mtime"]}, expected {source_mtime}')
+
+        # A custom corpus: running text, with each word many times over
+        corpus_path = os.path.join(temp_dir, 'corpus.txt')
+        with open(corpus_path, 'w', encoding='utf-8') as fo:
+            for _ in range(4):
+                shuffled = rng.sample(words, len(words))
+                for i in range(0, len(shuffled), 12):
+                    fo.write(' '.join(shuffled[i:i + 12]) + '.\n')
+        corpus_words = sorted(set(iter_tokens(corpus_path)))
+        corpus_matches = {search_string: reference_find(corpus_words, search_string) for search_string in matches}
+        index_cases, index_mismatches = compare_index('custom', load_custom_index(corpus_path, cache_dir), corpus_words, corpus_matches)
+        cases += index_cases
+        mismatches += index_mismatches
+        # With runs small enough that both the words and the postings are merged from many files
+        spilled_path = os.path.join(temp_dir, 'spilled' + mm2sc_corpus.INDEX_EXTENSION)
+        sorted_words = iter_unique_sorted(iter_tokens(corpus_path), run_size=3000, temp_dir=temp_dir)
+        compile_sorted_words(sorted_words, spilled_path, run_size=20000)
+        index_cases, index_mismatches = compare_index('custom, spilled', open_compiled_index(spilled_path), corpus_words, corpus_matches)
+        cases += index_cases
+        mismatches += index_mismatches
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return cases, mismatches
+
+
+# ========== Word widths ========== #
+
+WIDTH_EXTRA_WORDS = ['', 'A', 'AVATAR', 'Toyota', 'ωmega', 'f_fi', 'ÀÉÎÕÜ', 'zyxwvu']  # Empty, one glyph, kerned, and characters the font lacks
+
+
+def reference_kerning(font, left, right):
+    '''
+    The kerning between two glyphs, looked up in the font’s kerning and groups as the UFO spec says:
+    glyph-glyph, glyph-group, group-glyph, then group-group.
+    '''
+
+    def group_of(gname, prefixes):
+        for group_name, members in font.groups.items():
+            if group_name.startswith(prefixes) and gname in members:
+                return group_name
+
+    from mm2sc_font import LEFT_GROUP_PREFIXES, RIGHT_GROUP_PREFIXES
+    left_group, right_group = group_of(left, LEFT_GROUP_PREFIXES), group_of(right, RIGHT_GROUP_PREFIXES)
+    for key in [(left, right), (left, right_group), (left_group, right), (left_group, right_group)]:
+        if None not in key and key in font.kerning:
+            return font.kerning[key]
+    return 0
+
+
+def reference_width(font, snapshot, word):
+    '''
+    A word’s width, glyph by glyph: each advance, plus the kerning with the next glyph.
+    '''
+
+    gnames = [snapshot.gname_for(char) for char in word]
+    gnames = [gname if gname in font else None for gname in gnames]
+    width = sum(font[gname].width for gname in gnames if gname is not None)
+    for left, right in zip(gnames, gnames[1:]):
+        if left is not None and right is not None:
+            width += reference_kerning(font, left, right)
+    return width
+
+
+def compare_widths(label, engine, font, snapshot, words):
+    '''
+    Returns the number of words measured with engine, and how their widths differ from reference_width().
+    '''
+
+    cases = 0
+    mismatches = []
+    for word, width in zip(words, engine.widths(words)):
+        cases += 1
+        expected = reference_width(font, snapshot, word)
+        if abs(width - expected) > 1e-6:
+            mismatches.append(f'{label}: {word!r} is {width} wide, expected {expected}')
+    return cases, mismatches
+
+
+def check_widths():
+    '''
+    WidthEngine.widths against a glyph-by-glyph sum with the UFO kerning lookup order, with and without numpy,
+    for both kinds of group names, and after glyph widths and kerning were changed in place.
+    '''
+
+    import mm2sc_font
+    from mm2sc_corpus import WordListStore, read_word_list
+    from mm2sc_font import FontSnapshot, KerningResolver, WidthEngine
+
+    rng = random.Random(1)
+    words = rng.sample(read_word_list(WordListStore().path_for(INDEX_WORD_LIST)), 3000)
+    words += [word.upper() for word in words[:500]] + WIDTH_EXTRA_WORDS
+
+    cases = 0
+    mismatches = []
+    numpy_module = mm2sc_font.import_numpy()
+    for use_numpy in ([True, False] if numpy_module is not None else [False]):
+        mm2sc_font.numpy = numpy_module if use_numpy else None
+        try:
+            for group_prefixes in [('public.kern1.', 'public.kern2.'), ('@MMK_L_', '@MMK_R_')]:
+                label = f'{"numpy" if use_numpy else "plain Python"}, {group_prefixes[0]}'
+                font = StandInFont(group_prefixes=group_prefixes)
+                snapshot = FontSnapshot(font, GN2UV)
+                kerning = KerningResolver(font)
+                engine = WidthEngine(font, snapshot, kerning)
+                word_cases, word_mismatches = compare_widths(label, engine, font, snapshot, words)
+                cases += word_cases
+                mismatches += word_mismatches
+
+                # Edits, as the font observers apply them
+                for gname in ['A', 'o', 'uni00C9']:
+                    font[gname].width += 37
+                    engine.set_width(gname, font[gname].width)
+                for pair in [(group_prefixes[0] + 'V', group_prefixes[1] + 'A'), (group_prefixes[0] + 'T', group_prefixes[1] + 'o')]:
+                    font.kerning[pair] = -93
+                    kerning.set_pair(pair, -93)
+                    if not engine.set_pair(pair, -93):
+                        engine = WidthEngine(font, snapshot, kerning)
+                word_cases, word_mismatches = compare_widths(label + ', edited', engine, font, snapshot, words)
+                cases += word_cases
+                mismatches += word_mismatches
+        finally:
+            mm2sc_font.numpy = numpy_module
+    return cases, mismatches
+
+
+# ========== Running ========== #
+
+CHECKS = {
+    'open_close': check_open_close,
+    'spacing': check_spacing,
+    'index': check_index,
+    'widths': check_widths,
+}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Check MM2SpaceCenter’s fast paths against their reference implementations, without RoboFont.')
+    parser.add_argument('checks', nargs='*', help=f'checks to run: {", ".join(CHECKS)} (default: all)')
+    options = parser.parse_args(args)
+    for name in options.checks:
+        if name not in CHECKS:
+            parser.error(f'Unknown check: {name}')
+
+    install_stand_in_modules()
+    failed = False
+    for name in options.checks or CHECKS:
+        try:
+            cases, mismatches = CHECKS[name]()
+        except Exception as e:
+            cases, mismatches = 0, [f'raised {e!r}']
+        print(f'{name:<12} {cases} cases, {len(mismatches)} mismatches')
+        for mismatch in mismatches[:MAX_SHOWN]:
+            print('   ', mismatch)
+        if len(mismatches) > MAX_SHOWN:
+            print(f'    … and {len(mismatches) - MAX_SHOWN} more')
+        failed = failed or bool(mismatches)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
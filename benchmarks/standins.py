@@ -0,0 +1,327 @@
+import os
+import sys
+import types
+import random
+import unicodedata
+import importlib.abc
+import importlib.util
+
+
+'''
+Stand-ins for the RoboFont, MetricsMachine and AppKit objects MM2SpaceCenter uses,
+so that the extension can be imported and driven on plain CPython.
+
+install_stand_in_modules() has to be called before MM2SpaceCenter is imported.
+Stand-in modules are only made when something imports them, and imported_stand_ins
+records which ones were, e.g. to check what MM2SpaceCenter imports at startup.
+The stand-in font has real glyph names, unicodes, widths, kern groups and kerning,
+so every code path that looks at the font does real work.
+'''
+
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'MM2SpaceCenter.roboFontExt', 'lib')
+
+
+# ========== Modules ========== #
+
+class StandIn:
+    '''
+    Accepts any call or attribute access, and does nothing.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return StandIn()
+
+    def __getattr__(self, name):
+        return StandIn()
+
+
+class StandInSubscriber:
+    pass
+
+
+def call_after(function, *args):
+    # There is no run loop, so "later on the main thread" is right away
+    function(*args)
+
+
+def call_later(delay, function, *args):
+    # Nor any waiting: the debounced call happens right away too
+    function(*args)
+
+
+extension_defaults = {}
+
+def get_extension_default(key, fallback=None):
+    return extension_defaults.get(key, fallback)
+
+
+def set_extension_default(key, value):
+    extension_defaults[key] = value
+
+
+# Filled in by StandInFont, like RoboFont’s own glyph name to unicode table
+GN2UV = {}
+
+
+def make_module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    module.__getattr__ = lambda attribute: StandIn
+    return module
+
+
+# Names of the stand-in modules imported so far
+imported_stand_ins = set()
+
+
+class StandInFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    '''
+    Makes a stand-in module when one of the given module names is imported.
+    '''
+
+    def __init__(self, modules):
+        self.modules = modules
+
+    def find_spec(self, name, path=None, target=None):
+        if name in self.modules:
+            return importlib.util.spec_from_loader(name, self, is_package=True)
+        return None
+
+    def create_module(self, spec):
+        return make_module(spec.name, **self.modules[spec.name])
+
+    def exec_module(self, module):
+        imported_stand_ins.add(module.__name__)
+
+
+def install_stand_in_modules():
+    '''
+    Registers stand-in modules for everything MM2SpaceCenter imports from RoboFont and its app bundle,
+    and puts the extension’s lib folder on sys.path.
+    '''
+
+    modules = {
+        'AppKit':                           {},
+        'PyObjCTools':                      {},
+        'PyObjCTools.AppHelper':            dict(callAfter=call_after, callLater=call_later),
+        'mojo':                             {},
+        'mojo.UI':                          dict(CurrentSpaceCenter=StandIn, OpenSpaceCenter=StandIn),
+        'mojo.subscriber':                  dict(Subscriber=StandInSubscriber, registerSpaceCenterSubscriber=StandIn()),
+        'mojo.events':                      dict(addObserver=StandIn(), removeObserver=StandIn()),
+        'mojo.extensions':                  dict(getExtensionDefault=get_extension_default, setExtensionDefault=set_extension_default, ExtensionBundle=StandIn),
+        'lib':                              {},
+        'lib.tools':                        {},
+        'lib.tools.unicodeTools':           dict(GN2UV=GN2UV),
+        'metricsMachine':                   dict(CurrentFont=StandIn(), GetCurrentPair=lambda: ('A', 'V'), GetPairList=lambda: []),
+        'vanilla':                          {},
+        'vanilla.dialogs':                  dict(getFile=lambda *args, **kwargs: None),
+        'defconAppKit':                     {},
+        'defconAppKit.windows':             {},
+        'defconAppKit.windows.baseWindow':  dict(BaseWindowController=StandIn),
+        'ezui':                             dict(WindowController=StandInSubscriber),
+    }
+    if not any(isinstance(finder, StandInFinder) for finder in sys.meta_path):
+        modules = {name: attributes for name, attributes in modules.items() if name not in sys.modules}
+        sys.meta_path.insert(0, StandInFinder(modules))
+    if LIB_DIR not in sys.path:
+        sys.path.insert(0, LIB_DIR)
+
+
+# ========== Font ========== #
+
+class Observable:
+    '''
+    The defcon observer methods MM2SpaceCenter registers with. Notifications are never sent.
+    '''
+
+    def addObserver(self, observer, method_name, notification):
+        pass
+
+    def removeObserver(self, observer, notification):
+        pass
+
+
+class StandInKerning(dict, Observable):
+    pass
+
+
+class StandInGroups(dict, Observable):
+    pass
+
+
+class StandInUnicodeData(Observable):
+    pass
+
+
+class StandInLayer(Observable):
+    pass
+
+
+class StandInLayerSet:
+    def __init__(self):
+        self.defaultLayer = StandInLayer()
+
+
+class StandInGlyph:
+    def __init__(self, name, unicodes, width):
+        self.name = name
+        self.unicodes = tuple(unicodes)
+        self.unicode = self.unicodes[0] if self.unicodes else None
+        self.width = width
+
+
+# Encoded glyphs besides a–z, A–Z and the Latin-1 and Latin Extended-A letters
+FIGURE_NAMES = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine']
+PUNCTUATION_NAMES = {
+    'space': ' ', 'hyphen': '-', 'period': '.', 'comma': ',', 'colon': ':', 'semicolon': ';',
+    'exclam': '!', 'exclamdown': '¡', 'question': '?', 'questiondown': '¿',
+    'quotesingle': "'", 'quotedbl': '"', 'quoteleft': '‘', 'quoteright': '’', 'quotedblleft': '“', 'quotedblright': '”',
+    'guilsinglleft': '‹', 'guilsinglright': '›', 'guillemotleft': '«', 'guillemotright': '»',
+    'parenleft': '(', 'parenright': ')', 'bracketleft': '[', 'bracketright': ']', 'braceleft': '{', 'braceright': '}',
+    'slash': '/', 'backslash': '\\', 'less': '<', 'greater': '>', 'fraction': '⁄',
+}
+
+
+def make_glyphs(rng):
+    '''
+    Returns the glyphs of a Latin font with small caps, ligatures and figure variants.
+    '''
+
+    encoded = {}
+    for char in 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz':
+        encoded[char] = char
+    for uni in range(0xC0, 0x180):
+        char = chr(uni)
+        if unicodedata.category(char).startswith('L'):
+            encoded['uni%04X' % uni] = char
+    for i, name in enumerate(FIGURE_NAMES):
+        encoded[name] = str(i)
+    encoded.update(PUNCTUATION_NAMES)
+
+    glyphs = []
+    for name, char in encoded.items():
+        width = 250 if char == ' ' else rng.randint(180, 780)
+        glyphs.append(StandInGlyph(name, [ord(char)], width))
+    for char in 'abcdefghijklmnopqrstuvwxyz':
+        glyphs.append(StandInGlyph(char + '.sc', [], rng.randint(300, 650)))
+    for name in FIGURE_NAMES:
+        glyphs.append(StandInGlyph(name + '.tf', [], 550))
+    for name in ['f_f', 'f_i', 'f_l', 'f_f_i']:
+        glyphs.append(StandInGlyph(name, [], rng.randint(450, 900)))
+    return glyphs
+
+
+# Kern groups by shape, as MetricsMachine would make them
+GROUP_MEMBERS = {
+    'O': ['O', 'C', 'D', 'G', 'Q'],
+    'H': ['H', 'B', 'E', 'F', 'I', 'K', 'M', 'N', 'P', 'R'],
+    'V': ['V', 'W', 'Y'],
+    'T': ['T'],
+    'A': ['A'],
+    'o': ['o', 'c', 'd', 'e', 'q'],
+    'n': ['n', 'h', 'i', 'm', 'r', 'u'],
+    'v': ['v', 'w', 'y'],
+    'f': ['f', 'f_f', 't'],
+    'figures': ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine'],
+    'sc': [char + '.sc' for char in 'abcdefghijklmnopqrstuvwxyz'],
+}
+
+
+def make_groups_and_kerning(glyphs, rng, prefixes=('public.kern1.', 'public.kern2.'), exceptions=400):
+    groups = StandInGroups()
+    glyph_names = [glyph.name for glyph in glyphs]
+    for name, members in GROUP_MEMBERS.items():
+        groups[prefixes[0] + name] = tuple(members)
+        groups[prefixes[1] + name] = tuple(members)
+
+    kerning = StandInKerning()
+    left_groups = [name for name in groups if name.startswith(prefixes[0])]
+    right_groups = [name for name in groups if name.startswith(prefixes[1])]
+    for left in left_groups:
+        for right in right_groups:
+            if rng.random() < 0.6:
+                kerning[(left, right)] = rng.randint(-120, 40)
+    # Glyph-to-group and glyph-to-glyph exceptions
+    for _ in range(exceptions):
+        left = rng.choice(glyph_names + left_groups)
+        right = rng.choice(glyph_names + right_groups)
+        kerning[(left, right)] = rng.randint(-150, 60)
+    return groups, kerning
+
+
+class StandInFont(Observable):
+    '''
+    A font, as far as MM2SpaceCenter is concerned. naked() returns the font itself.
+    '''
+
+    def __init__(self, seed=1, group_prefixes=('public.kern1.', 'public.kern2.')):
+        rng = random.Random(seed)
+        self._glyphs = {glyph.name: glyph for glyph in make_glyphs(rng)}
+        self.groups, self.kerning = make_groups_and_kerning(list(self._glyphs.values()), rng, group_prefixes)
+        self.unicodeData = StandInUnicodeData()
+        self.layers = StandInLayerSet()
+        self.dispatcher = Observable()
+        for glyph in self._glyphs.values():
+            if glyph.unicodes:
+                GN2UV.setdefault(glyph.name, glyph.unicodes[0])
+
+    def naked(self):
+        return self
+
+    def keys(self):
+        return self._glyphs.keys()
+
+    def __iter__(self):
+        return iter(self._glyphs.values())
+
+    def __len__(self):
+        return len(self._glyphs)
+
+    def __getitem__(self, name):
+        return self._glyphs[name]
+
+    def __contains__(self, name):
+        return name in self._glyphs
+
+
+# ========== Space Center ========== #
+
+class StandInGlyphLineView:
+    def __init__(self):
+        self.apply_kerning = False
+
+    def getApplyKerning(self):
+        return self.apply_kerning
+
+    def setApplyKerning(self, value):
+        self.apply_kerning = value
+
+
+class StandInSpaceCenter:
+    '''
+    Keeps the last text it was given.
+    '''
+
+    def __init__(self):
+        self.raw = ''
+        self.glyphLineView = StandInGlyphLineView()
+
+    def setRaw(self, text):
+        self.raw = text
+
+    def getRaw(self):
+        return self.raw
+
+
+def make_tool(tool_class, space_center=None):
+    '''
+    Returns an MM2SC_Tool attached to a stand-in Space Center, without going through Subscriber.
+    '''
+
+    tool = tool_class.__new__(tool_class)
+    tool.sc = space_center if space_center is not None else StandInSpaceCenter()
+    return tool